@@ -0,0 +1,1072 @@
+#!/usr/bin/env python3
+"""
+FaceTrust AI performance benchmarks
+Run `python benchmark.py <command> --help` for the options of each benchmark.
+"""
+import argparse
+import os
+import sys
+import time
+
+MODEL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "src", "model")
+sys.path.insert(0, MODEL_DIR)
+
+DEFAULT_MODELS_PATH = os.path.join(MODEL_DIR, "Models")
+
+# Same detection settings as FaceRecognitionModel.training_params()
+ENROLLMENT_PARAMS = {
+    "detector": "haar_default",
+    "detector_params": {"cascade": "haarcascade_frontalface_default.xml", "scale_factor": 1.1, "min_neighbors": 5},
+    "detection_max_side": 640,
+    "min_face_size": 80,
+    "primary_min_face_fraction": 0.1,
+    "face_size": [200, 200],
+}
+
+
+def bench_enroll(args):
+    """Enrollment throughput for increasing worker counts"""
+    from enrollment import available_cpus, run_enrollment, scan_gallery
+
+    entries = scan_gallery(args.models_path) * args.replicate
+
+    worker_counts = [1]
+    while worker_counts[-1] * 2 <= available_cpus():
+        worker_counts.append(worker_counts[-1] * 2)
+    if worker_counts[-1] != available_cpus():
+        worker_counts.append(available_cpus())
+
+    print(f"Enrolling {len(entries)} images from {args.models_path}")
+    baseline = None
+    for workers in worker_counts:
+        start = time.perf_counter()
+        report = run_enrollment(entries, ENROLLMENT_PARAMS, workers=workers)
+        elapsed = time.perf_counter() - start
+        throughput = len(entries) / elapsed
+        baseline = baseline or throughput
+        print(f"  workers={report.workers:<3} {elapsed:7.2f}s  {throughput:8.1f} images/s  "
+              f"speed-up x{throughput / baseline:.2f}  ({len(report.failures)} failed)")
+
+    if args.cache:
+        import tempfile
+        from enrollment import DetectionCache
+
+        with tempfile.TemporaryDirectory() as directory:
+            for run in ("cold", "warm"):
+                cache = DetectionCache(os.path.join(directory, "detections.json"), ENROLLMENT_PARAMS)
+                start = time.perf_counter()
+                report = run_enrollment(entries, ENROLLMENT_PARAMS, cache=cache)
+                elapsed = time.perf_counter() - start
+                print(f"  detection cache {run}: {elapsed:7.2f}s  {len(entries) / elapsed:8.1f} images/s  "
+                      f"({report.cache_hits} hits, {report.cache_misses} misses)")
+
+
+def bench_detect(args):
+    """Haar detection latency per input size, full resolution vs downscaled"""
+    import contextlib
+    import io
+    import cv2
+    from face_model import FaceRecognitionModel
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        model = FaceRecognitionModel(args.models_path)
+    photos = [cv2.imread(os.path.join(args.models_path, name)) for name in sorted(os.listdir(args.models_path))
+              if name.lower().endswith((".jpg", ".jpeg", ".png"))]
+
+    print(f"Detection on a copy bounded to {args.max_side}px vs full resolution ({args.repeat} runs per image)")
+    for height in args.heights:
+        frames = [cv2.cvtColor(cv2.resize(photo, (round(photo.shape[1] * height / photo.shape[0]), height)),
+                               cv2.COLOR_BGR2GRAY) for photo in photos]
+        timings = {}
+        found = {}
+        for label, max_side in (("full", None), ("downscaled", args.max_side)):
+            start = time.perf_counter()
+            faces = 0
+            for gray in frames:
+                for _ in range(args.repeat):
+                    faces += len(model.detect_faces(gray, max_side=max_side))
+            timings[label] = (time.perf_counter() - start) * 1000 / (len(photos) * args.repeat)
+            found[label] = faces / args.repeat
+        print(f"  {height:>5}p  full {timings['full']:7.1f} ms   downscaled {timings['downscaled']:7.1f} ms   "
+              f"x{timings['full'] / timings['downscaled']:.1f}   faces {found['full']:.0f} / {found['downscaled']:.0f}")
+
+
+def bench_detectors(args):
+    """Latency and recall of every detector backend on a local image set"""
+    import contextlib
+    import io
+    import cv2
+    import numpy as np
+    from face_detectors import DETECTORS
+    from face_model import FaceRecognitionModel
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        model = FaceRecognitionModel(args.models_path)
+
+    # Every gallery photo shows exactly one face; variants keep that true
+    rng = np.random.default_rng(0)
+    images = []
+    for name in sorted(os.listdir(args.images)):
+        if not name.lower().endswith((".jpg", ".jpeg", ".png")):
+            continue
+        photo = cv2.imread(os.path.join(args.images, name))
+        images.append(photo)
+        for _ in range(args.variants):
+            height, width = photo.shape[:2]
+            matrix = cv2.getRotationMatrix2D((width / 2, height / 2), rng.uniform(-10, 10), rng.uniform(0.6, 1.2))
+            variant = cv2.warpAffine(photo, matrix, (width, height), borderMode=cv2.BORDER_REPLICATE)
+            images.append(cv2.convertScaleAbs(variant, alpha=rng.uniform(0.7, 1.3), beta=rng.uniform(-30, 30)))
+    frames = [cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) for image in images]
+
+    print(f"{len(frames)} images with one face each from {args.images}")
+    for name in sorted(DETECTORS):
+        model.detect_faces(frames[0], detector=name)  # Load the cascades outside the timing
+        start = time.perf_counter()
+        counts = [len(model.detect_faces(gray, detector=name)) for gray in frames]
+        elapsed_ms = (time.perf_counter() - start) * 1000 / len(frames)
+        recall = sum(count > 0 for count in counts) / len(frames)
+        extra = sum(max(0, count - 1) for count in counts) / len(frames)
+        print(f"  {name:<14} {elapsed_ms:7.1f} ms/image   recall {recall:.3f}   extra boxes/image {extra:.2f}")
+
+
+def bench_primary(args):
+    """Recognition latency with every face vs the primary (largest) face only"""
+    import contextlib
+    import io
+    import cv2
+    from face_model import FaceRecognitionModel
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        model = FaceRecognitionModel(args.models_path)
+    photos = [cv2.imread(os.path.join(args.models_path, name)) for name in sorted(os.listdir(args.models_path))
+              if name.lower().endswith((".jpg", ".jpeg", ".png"))]
+
+    print(f"recognize_face_from_image(), {args.repeat} runs per image")
+    for height in args.heights:
+        frames = [cv2.resize(photo, (round(photo.shape[1] * height / photo.shape[0]), height)) for photo in photos]
+        timings = {}
+        names = {}
+        for label, primary_only in (("all", False), ("primary", True)):
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                for frame in frames:
+                    for _ in range(args.repeat):
+                        result = model.recognize_face_from_image(frame, primary_only=primary_only)
+                    faces = sorted(result["results"], key=lambda r: r["bounding_box"]["width"], reverse=True)
+                    names.setdefault(label, []).append(faces[0]["name"] if faces else None)
+            timings[label] = (time.perf_counter() - start) * 1000 / (len(frames) * args.repeat)
+        agree = sum(a == p for a, p in zip(names["all"], names["primary"]))
+        print(f"  {height:>5}p  all faces {timings['all']:7.1f} ms   primary {timings['primary']:7.1f} ms   "
+              f"x{timings['all'] / timings['primary']:.1f}   same largest face {agree}/{len(frames)}")
+
+
+def bench_prefilter(args):
+    """Cost of the frame pre-filter vs full recognition, on good and unusable frames"""
+    import contextlib
+    import io
+    import cv2
+    import numpy as np
+    from face_model import FaceRecognitionModel
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        model = FaceRecognitionModel(args.models_path)
+    photos = [cv2.imread(os.path.join(args.models_path, name)) for name in sorted(os.listdir(args.models_path))
+              if name.lower().endswith((".jpg", ".jpeg", ".png"))]
+    motion = np.full((1, 41), 1 / 41.0, dtype=np.float32)
+
+    def degraded(frame):
+        return {
+            "good": frame,
+            "black": (frame * 0.05).astype(np.uint8),
+            "overexposed": cv2.convertScaleAbs(frame, alpha=1.0, beta=220),
+            "blurred": cv2.GaussianBlur(frame, (0, 0), frame.shape[0] / 100),
+            "motion blur": cv2.filter2D(frame, -1, motion),
+        }
+
+    print(f"{args.repeat} runs per frame")
+    for height in args.heights:
+        frames = [cv2.resize(photo, (round(photo.shape[1] * height / photo.shape[0]), height)) for photo in photos]
+        print(f"  {height}p")
+        for kind in degraded(frames[0]):
+            variants = [degraded(frame)[kind] for frame in frames]
+            model.prefilter(variants[0])
+            start = time.perf_counter()
+            for frame in variants:
+                for _ in range(args.repeat):
+                    model.prefilter(frame)
+            check_ms = (time.perf_counter() - start) * 1000 / (len(variants) * args.repeat)
+            timings = {}
+            for enabled in (False, True):
+                model.prefilter_frames = enabled
+                start = time.perf_counter()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    for frame in variants:
+                        for _ in range(args.repeat):
+                            model.recognize_face_from_image(frame)
+                timings[enabled] = (time.perf_counter() - start) * 1000 / (len(variants) * args.repeat)
+            reasons = [model.prefilter(frame)[1] for frame in variants]
+            print(f"    {kind:<12} pre-filter {check_ms:6.3f} ms   recognize {timings[False]:7.1f} -> "
+                  f"{timings[True]:7.1f} ms   rejected {sum(map(bool, reasons))}/{len(variants)} "
+                  f"{sorted(set(filter(None, reasons)))}")
+
+
+def bench_cache(args):
+    """Recognition of resubmitted frames with and without the frame result cache"""
+    import contextlib
+    import io
+    from concurrent.futures import ThreadPoolExecutor
+    import cv2
+    import numpy as np
+    from frame_cache import FrameResultCache
+    from face_model import FaceRecognitionModel
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        model = FaceRecognitionModel(args.models_path)
+    photos = [cv2.imread(os.path.join(args.models_path, name)) for name in sorted(os.listdir(args.models_path))
+              if name.lower().endswith((".jpg", ".jpeg", ".png"))]
+    rng = np.random.default_rng(0)
+
+    # Each photo is resubmitted as a fresh JPEG of a slightly noisy capture,
+    # like a camera retrying on a still scene
+    def resubmission(photo):
+        noisy = np.clip(photo + rng.normal(0, 2, photo.shape), 0, 255).astype(np.uint8)
+        return cv2.imdecode(cv2.imencode(".jpg", noisy, [cv2.IMWRITE_JPEG_QUALITY, 85])[1], cv2.IMREAD_COLOR)
+
+    frames = [resubmission(photos[i % len(photos)]) for i in range(args.frames)]
+    print(f"{args.frames} submissions of {len(photos)} scenes, {args.threads} concurrent")
+    names = {}
+    for label, cache in (("no cache", None), ("cache", FrameResultCache())):
+        model.result_cache = cache
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()), ThreadPoolExecutor(args.threads) as pool:
+            results = list(pool.map(lambda frame: model.recognize_face_from_image(frame, primary_only=True),
+                                    frames))
+        elapsed = time.perf_counter() - start
+        names[label] = [result["results"][0]["name"] if result["results"] else None for result in results]
+        print(f"  {label:<9} {len(frames) / elapsed:7.1f} frames/s   {elapsed * 1000 / len(frames):6.1f} ms/frame")
+        if cache is not None:
+            print(f"            {cache.stats()}")
+    same = sum(a == b for a, b in zip(names["no cache"], names["cache"]))
+    print(f"  same answers {same}/{len(frames)}")
+
+    # Enrolling into the existing matcher must invalidate cached results
+    # (in memory only: enroll_face without team data writes nothing to disk)
+    frame = frames[0]
+    model.recognize_face_from_image(frame, top_k=5)
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    face_roi = model.crop_faces(gray, [max(model.detect_faces(gray), key=lambda f: f[2] * f[3])])[0]
+    with contextlib.redirect_stdout(io.StringIO()):
+        model.enroll_face("Benchmark_Probe", face_roi)
+    misses = cache.misses
+    after = model.recognize_face_from_image(frame, top_k=5)
+    names = [candidate["name"] for candidate in after["results"][0]["candidates"]]
+    ok = cache.misses == misses + 1 and "Benchmark_Probe" in names
+    print(f"  enroll invalidates cache: {'yes' if ok else 'NO'} (top-5 after enroll: {names})")
+
+
+def bench_upload(args):
+    """Request image decoding per body type: base64 JSON vs raw image/jpeg vs multipart"""
+    import base64
+    import io
+    import tracemalloc
+    import cv2
+    import numpy as np
+    from flask import Flask
+    from image_io import decode_request_image
+
+    app = Flask(__name__)
+    rng = np.random.default_rng(0)
+    print(f"decode_request_image(), {args.repeat} runs; extra = peak allocation beyond the decoded image")
+    for height in args.heights:
+        width = height * 16 // 9
+        frame = cv2.GaussianBlur(rng.integers(0, 256, (height, width, 3), dtype=np.uint8), (0, 0), 2)
+        jpeg = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, 90])[1].tobytes()
+        bodies = {
+            "base64 JSON": lambda: {"json": {"image": "data:image/jpeg;base64," + base64.b64encode(jpeg).decode()}},
+            "image/jpeg": lambda: {"data": jpeg, "content_type": "image/jpeg"},
+            "multipart": lambda: {"data": {"image": (io.BytesIO(jpeg), "frame.jpg")},
+                                  "content_type": "multipart/form-data"},
+        }
+        print(f"  {height}p, {len(jpeg) / 1e6:.2f} MB JPEG")
+        for label, body in bodies.items():
+            elapsed = 0.0
+            for _ in range(args.repeat):
+                with app.test_request_context("/recognize", method="POST", **body()) as context:
+                    start = time.perf_counter()
+                    image = decode_request_image(context.request)
+                    elapsed += time.perf_counter() - start
+            with app.test_request_context("/recognize", method="POST", **body()) as context:
+                tracemalloc.start()
+                image = decode_request_image(context.request)
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+            print(f"    {label:<12} {elapsed * 1000 / args.repeat:6.1f} ms   "
+                  f"extra {(peak - image.nbytes) / len(jpeg):4.1f}x the upload size")
+
+
+def bench_decode(args):
+    """Frame decoding for recognition: colour + cvtColor vs grayscale vs reduced grayscale"""
+    import tracemalloc
+    import cv2
+    import numpy as np
+    from image_io import decode_for_recognition
+
+    photos = [cv2.imread(os.path.join(args.models_path, name)) for name in sorted(os.listdir(args.models_path))
+              if name.lower().endswith((".jpg", ".jpeg", ".png"))]
+    paths = {
+        "colour+cvtColor": lambda buffer: cv2.cvtColor(cv2.imdecode(np.frombuffer(buffer, np.uint8),
+                                                                    cv2.IMREAD_COLOR), cv2.COLOR_BGR2GRAY),
+        "grayscale": lambda buffer: cv2.imdecode(np.frombuffer(buffer, np.uint8), cv2.IMREAD_GRAYSCALE),
+        "reduced gray": lambda buffer: decode_for_recognition(buffer, args.max_side)[0],
+    }
+    print(f"{args.repeat} decodes per JPEG, reduced to no less than {args.max_side} px on the longer side")
+    for height in args.heights:
+        buffers = [cv2.imencode(".jpg", cv2.resize(photo, (round(photo.shape[1] * height / photo.shape[0]), height)),
+                                [cv2.IMWRITE_JPEG_QUALITY, 90])[1].tobytes() for photo in photos]
+        print(f"  {height}p")
+        for label, decode in paths.items():
+            decode(buffers[0])
+            start = time.perf_counter()
+            for buffer in buffers:
+                for _ in range(args.repeat):
+                    frame = decode(buffer)
+            elapsed = (time.perf_counter() - start) * 1000 / (len(buffers) * args.repeat)
+            tracemalloc.start()
+            frame = decode(buffers[0])
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            print(f"    {label:<16} {elapsed:6.1f} ms   peak {peak / 1e6:5.1f} MB   frame {frame.shape[1]}x{frame.shape[0]}")
+
+
+def bench_identity(args):
+    """Matched /recognize response building: per-request identity dict vs pre-serialized template"""
+    import json
+    from flask import Flask, jsonify
+    from identity_templates import COMPACT_IDENTITY_FIELDS, IdentityTemplate
+
+    app = Flask(__name__)
+    with open(os.path.join(args.models_path, "team_data.json")) as f:
+        team_data = json.load(f)
+    name = sorted(team_data)[0]
+    template = IdentityTemplate(name, team_data[name])
+    response = {"matched": True, "confidence": 0.83, "confidence_percentage": 83.0, "liveness": 0.95,
+                "reason": template.reason(83.0), "processing_time": 850,
+                "image_quality": {"brightness": 0.8, "contrast": 0.7, "sharpness": 0.9, "face_size": 0.4,
+                                  "angle_quality": 0.8},
+                "technical_details": {"distance": 41.2, "raw_confidence": 0.83,
+                                      "face_coordinates": {"x": 10, "y": 20, "width": 200, "height": 200},
+                                      "algorithm": "LBPH", "model_version": "1.0",
+                                      "detection_time": "2024-01-01T00:00:00Z"}}
+    timestamp, session_id = "2024-01-01T00:00:00Z", "SESSION-00001"
+
+    def per_request():
+        # What /recognize did before: build every identity field, then jsonify it all
+        identity = dict(IdentityTemplate(name, team_data[name]).identity,
+                        **template.request_fields(0.83, timestamp, session_id))
+        return jsonify(dict(response, identity=identity))
+
+    def pre_serialized():
+        identity_json = template.render_json(0.83, timestamp, session_id)
+        body = app.json.dumps(response, separators=(",", ":"))
+        return app.response_class(f'{body[:-1]},"identity":{identity_json}}}\n', mimetype=app.json.mimetype)
+
+    def compact():
+        trimmed = {key: value for key, value in response.items() if key != "technical_details"}
+        return jsonify(dict(trimmed, identity=template.render(COMPACT_IDENTITY_FIELDS, 0.83, timestamp, session_id)))
+
+    with app.app_context():
+        print(f"{args.repeat} matched responses for {name}")
+        for label, build in (("per-request dict", per_request), ("template", pre_serialized),
+                             ("template compact", compact)):
+            size = len(build().get_data())
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                build()
+            elapsed = (time.perf_counter() - start) * 1e6 / args.repeat
+            print(f"  {label:<17} {elapsed:6.1f} us/response   {size:5d} bytes")
+
+
+def bench_logging(args):
+    """Recognition latency with print() vs queued, sampled logging to a slow stdout"""
+    import contextlib
+    import io
+    import logging
+    import cv2
+    import log_config
+    from face_model import FaceRecognitionModel
+
+    class SlowStream(io.StringIO):
+        # A log pipe whose reader is behind: every write blocks for a while
+        def write(self, text):
+            time.sleep(args.write_latency / 1000)
+            return super().write(text)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        model = FaceRecognitionModel(args.models_path)
+    model.result_cache = None
+    photos = [cv2.imread(os.path.join(args.models_path, name)) for name in sorted(os.listdir(args.models_path))
+              if name.lower().endswith((".jpg", ".jpeg", ".png"))]
+    judge = model._judge_faces
+
+    def judge_with_prints(gallery, faces, matches, top_k=None):
+        # The seven per-face lines _judge_faces used to print
+        for (x, y, w, h), candidates in zip(faces, matches):
+            label, distance = candidates[0]
+            confidence = model.distance_to_confidence(distance)
+            print("STRICT SECURITY CHECK:")
+            print(f"  Label: {label}")
+            print(f"  Distance: {distance:.2f}")
+            print(f"  Confidence: {confidence:.3f} ({confidence*100:.1f}%)")
+            print(f"  Threshold: {model.confidence_threshold}")
+            print(f"  Required confidence: {model.min_match_confidence}")
+            print(f"  SECURITY DECISION: {'✅ AUTHORIZED' if model.passes_thresholds(distance, confidence) else '❌ UNAUTHORIZED'}")
+        return judge(gallery, faces, matches, top_k)
+
+    modes = [
+        ("print() x7", {"FACETRUST_LOG_LEVEL": "INFO"}, judge_with_prints),
+        ("sync DEBUG", {"FACETRUST_LOG_LEVEL": "DEBUG", "FACETRUST_LOG_ASYNC": "0", "FACETRUST_LOG_SAMPLING": "DEBUG=1"}, judge),
+        ("queued DEBUG", {"FACETRUST_LOG_LEVEL": "DEBUG", "FACETRUST_LOG_ASYNC": "1", "FACETRUST_LOG_SAMPLING": "DEBUG=1"}, judge),
+        ("queued 10%", {"FACETRUST_LOG_LEVEL": "DEBUG", "FACETRUST_LOG_ASYNC": "1", "FACETRUST_LOG_SAMPLING": "DEBUG=0.1"}, judge),
+        ("INFO only", {"FACETRUST_LOG_LEVEL": "INFO", "FACETRUST_LOG_ASYNC": "1"}, judge),
+    ]
+    print(f"{args.repeat} recognitions, stdout writes blocking {args.write_latency} ms")
+    stdout = sys.stdout
+    for label, env, judge_faces in modes:
+        os.environ.update(env)
+        sink = SlowStream()
+        sys.stdout = sink
+        try:
+            log_config.configure()
+            model._judge_faces = judge_faces
+            start = time.perf_counter()
+            for i in range(args.repeat):
+                model.recognize_face_from_image(photos[i % len(photos)], primary_only=True)
+            elapsed = (time.perf_counter() - start) * 1000 / args.repeat
+            log_config.shutdown()
+        finally:
+            sys.stdout = stdout
+            model._judge_faces = judge
+        lines = sink.getvalue().count("\n")
+        print(f"  {label:<13} {elapsed:6.1f} ms/recognition   {lines:4d} lines written")
+    logging.getLogger().handlers.clear()
+
+
+def bench_stream(args):
+    """Camera session: one HTTP request per frame vs the /recognize/stream WebSocket"""
+    import base64
+    import contextlib
+    import io
+    import json
+    import logging
+    import statistics
+    import threading
+    import urllib.request
+    import cv2
+    import numpy as np
+    import simple_websocket
+    from werkzeug.serving import make_server
+
+    os.chdir(MODEL_DIR)
+    os.environ.setdefault("FACETRUST_WATCH_INTERVAL", "0")
+    with contextlib.redirect_stdout(io.StringIO()):
+        import web_interface
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    # Every frame is recognized from scratch, the result cache would hide the per-frame cost
+    web_interface.face_model.result_cache = None
+
+    server = make_server("127.0.0.1", args.port, web_interface.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    # A camera on a still scene: the same photo with fresh sensor noise per frame
+    photo = cv2.imread(os.path.join(args.models_path, sorted(
+        name for name in os.listdir(args.models_path) if name.lower().endswith((".jpg", ".jpeg", ".png")))[0]))
+    rng = np.random.default_rng(0)
+    frames = [cv2.imencode(".jpg", np.clip(photo + rng.normal(0, 2, photo.shape), 0, 255).astype(np.uint8),
+                           [cv2.IMWRITE_JPEG_QUALITY, 85])[1].tobytes() for _ in range(16)]
+    count = int(args.fps * args.seconds)
+    interval = 1.0 / args.fps
+
+    def report(label, latencies, sent, skipped):
+        latencies = sorted(latencies)
+        print(f"  {label:<16} {len(latencies) / args.seconds:5.1f} results/s   capture->result "
+              f"median {statistics.median(latencies):6.1f} ms  p95 {latencies[int(len(latencies) * 0.95)]:6.1f} ms   "
+              f"{sent} frames sent, {skipped} camera frames skipped")
+
+    def http_polling():
+        # Like the browser today: capture, base64 into JSON, POST, wait, repeat
+        latencies = []
+        start = time.perf_counter()
+        sent = 0
+        while time.perf_counter() - start < args.seconds:
+            captured = time.perf_counter()
+            body = json.dumps({"image": "data:image/jpeg;base64," + base64.b64encode(frames[sent % len(frames)]).decode()})
+            request = urllib.request.Request(f"http://127.0.0.1:{args.port}/recognize", data=body.encode(),
+                                             headers={"Content-Type": "application/json"})
+            json.loads(urllib.request.urlopen(request).read())
+            latencies.append((time.perf_counter() - captured) * 1000)
+            sent += 1
+            # Next frame at the next camera tick
+            time.sleep(max(0.0, interval - (time.perf_counter() - captured)))
+        return latencies, sent, count - sent
+
+    def websocket():
+        ws = simple_websocket.Client.connect(f"ws://127.0.0.1:{args.port}/recognize/stream")
+        captured = {}
+        latencies = []
+
+        def camera():
+            start = time.perf_counter()
+            for i in range(count):
+                time.sleep(max(0.0, start + i * interval - time.perf_counter()))
+                captured[i + 1] = time.perf_counter()
+                ws.send(frames[i % len(frames)])
+
+        sender = threading.Thread(target=camera)
+        sender.start()
+        dropped = 0
+        while True:
+            message = ws.receive(timeout=1.0)
+            if message is None:
+                break
+            result = json.loads(message)
+            latencies.append((time.perf_counter() - captured[result["frame"]]) * 1000)
+            dropped = result["frames_dropped"]
+        sender.join()
+        ws.close()
+        return latencies, count, dropped
+
+    print(f"{args.fps} fps camera for {args.seconds}s, one session")
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            polling = http_polling()
+        report("HTTP per frame", *polling)
+        with contextlib.redirect_stdout(io.StringIO()):
+            stream = websocket()
+        report("WebSocket stream", *stream)
+    finally:
+        server.shutdown()
+
+
+def bench_slow(args):
+    """Fast /recognize requests while many clients upload slowly: sync gunicorn vs the ASGI mode"""
+    import json
+    import socket
+    import statistics
+    import subprocess
+    import threading
+    import urllib.request
+
+    with open(os.path.join(args.models_path, sorted(
+            name for name in os.listdir(args.models_path) if name.lower().endswith((".jpg", ".jpeg")))[0]), "rb") as f:
+        jpeg = f.read()
+    chunk = max(1, int(args.rate / 10))
+
+    def post(path, body, pace=None):
+        # Raw socket, so the upload can be trickled like a congested mobile link
+        with socket.create_connection(("127.0.0.1", args.port), timeout=120) as conn:
+            conn.sendall(f"POST {path} HTTP/1.1\r\nHost: localhost\r\nContent-Type: image/jpeg\r\n"
+                         f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode())
+            for offset in range(0, len(body), chunk if pace else len(body)):
+                conn.sendall(body[offset:offset + (chunk if pace else len(body))])
+                if pace:
+                    time.sleep(chunk / args.rate)
+            response = b""
+            while True:
+                data = conn.recv(65536)
+                if not data:
+                    break
+                response += data
+        return int(response.split(b" ", 2)[1]) if response else 0
+
+    def wait_ready(process):
+        for _ in range(300):
+            if process.poll() is not None:
+                raise RuntimeError("server exited during startup")
+            try:
+                urllib.request.urlopen(f"http://127.0.0.1:{args.port}/health", timeout=1).read()
+                return
+            except OSError:
+                time.sleep(0.1)
+        raise RuntimeError("server did not start")
+
+    env = dict(os.environ, PORT=str(args.port), WEB_CONCURRENCY="1", FACETRUST_WATCH_INTERVAL="0")
+    modes = [
+        ("gunicorn sync", ["gunicorn", "--config", "gunicorn.conf.py", "web_interface:app"], {"FACETRUST_THREADS": "1"}),
+        ("gunicorn gthread", ["gunicorn", "--config", "gunicorn.conf.py", "web_interface:app"], {"FACETRUST_THREADS": "4"}),
+        ("asgi (uvicorn)", [sys.executable, "asgi_app.py"], {}),
+    ]
+    print(f"{args.slow_clients} clients uploading {len(jpeg) / 1000:.0f} kB at {args.rate / 1000:.0f} kB/s "
+          f"(~{len(jpeg) / args.rate:.1f}s each), one worker, fast client for {args.seconds}s")
+    for label, command, extra_env in modes:
+        process = subprocess.Popen(command, cwd=MODEL_DIR, env=dict(env, **extra_env),
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            wait_ready(process)
+            slow_status = []
+            slow = [threading.Thread(target=lambda: slow_status.append(post("/recognize", jpeg, pace=True)))
+                    for _ in range(args.slow_clients)]
+            for thread in slow:
+                thread.start()
+            time.sleep(0.5)
+            latencies = []
+            fast_status = []
+            start = time.perf_counter()
+            while time.perf_counter() - start < args.seconds:
+                request_start = time.perf_counter()
+                fast_status.append(post("/recognize?compact=1", jpeg))
+                latencies.append((time.perf_counter() - request_start) * 1000)
+            for thread in slow:
+                thread.join()
+            latencies.sort()
+            print(f"  {label:<17} fast: {len(latencies):4d} done, median {statistics.median(latencies):7.1f} ms, "
+                  f"max {latencies[-1]:7.1f} ms, {fast_status.count(200)} ok   "
+                  f"slow: {slow_status.count(200)}/{args.slow_clients} ok"
+                  + "".join(f", {slow_status.count(code)}x {code}" for code in sorted(set(slow_status) - {200})))
+        finally:
+            process.terminate()
+            process.wait()
+
+
+def bench_batch(args):
+    """Throughput of recognize_batch() per thread count vs one call per image"""
+    import contextlib
+    import io
+    from concurrent.futures import ThreadPoolExecutor
+    import cv2
+    from enrollment import available_cpus
+    from face_model import FaceRecognitionModel
+    from image_io import decode_for_recognition
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        model = FaceRecognitionModel(args.models_path)
+    photos = [cv2.imread(os.path.join(args.models_path, name)) for name in sorted(os.listdir(args.models_path))
+              if name.lower().endswith((".jpg", ".jpeg", ".png"))]
+    payloads = [cv2.imencode(".jpg", photos[i % len(photos)])[1].tobytes() for i in range(args.images)]
+
+    def decode(payload):
+        return decode_for_recognition(payload, model.detection_max_side)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        for payload in payloads:
+            frame, scale = decode(payload)
+            model.recognize_face_from_image(frame, primary_only=True, scale=scale)
+        sequential = len(payloads) / (time.perf_counter() - start)
+    print(f"  one call per image      {sequential:7.1f} images/s")
+
+    threads = 1
+    while True:
+        model._executor = ThreadPoolExecutor(max_workers=threads)
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            model.recognize_batch(payloads, primary_only=True, decode=decode)
+            throughput = len(payloads) / (time.perf_counter() - start)
+        model._executor.shutdown()
+        print(f"  batch, {threads:>2} threads       {throughput:7.1f} images/s   x{throughput / sequential:.2f}")
+        if threads >= available_cpus():
+            break
+        threads = min(threads * 2, available_cpus())
+
+
+def bench_stress(args):
+    """Concurrent /recognize requests against the threaded Flask server"""
+    import base64
+    import contextlib
+    import io
+    import json
+    import logging
+    import threading
+    import urllib.request
+    from concurrent.futures import ThreadPoolExecutor
+    from werkzeug.serving import make_server
+
+    # web_interface loads the gallery from ./Models, like the Procfile does
+    os.chdir(MODEL_DIR)
+    os.environ.setdefault("FACETRUST_WATCH_INTERVAL", "0")
+    with contextlib.redirect_stdout(io.StringIO()):
+        import web_interface
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+
+    server = make_server("127.0.0.1", args.port, web_interface.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    images = [name for name in sorted(os.listdir(args.models_path)) if name.lower().endswith((".jpg", ".jpeg", ".png"))]
+    bodies = []
+    for name in images:
+        with open(os.path.join(args.models_path, name), "rb") as f:
+            bodies.append(json.dumps({"image": base64.b64encode(f.read()).decode("ascii")}).encode("utf-8"))
+
+    def recognize(i):
+        request = urllib.request.Request(f"http://127.0.0.1:{args.port}/recognize", data=bodies[i % len(bodies)],
+                                         headers={"Content-Type": "application/json"})
+        response = json.loads(urllib.request.urlopen(request).read())
+        return response.get("identity", {}).get("full_name") if response.get("matched") else None
+
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            expected = [recognize(i) for i in range(len(bodies))]
+        baseline = None
+        for concurrency in args.concurrency:
+            with contextlib.redirect_stdout(io.StringIO()), ThreadPoolExecutor(concurrency) as pool:
+                start = time.perf_counter()
+                names = list(pool.map(recognize, range(args.requests)))
+                throughput = args.requests / (time.perf_counter() - start)
+            wrong = sum(name != expected[i % len(bodies)] for i, name in enumerate(names))
+            baseline = baseline or throughput
+            print(f"  concurrency={concurrency:<3} {throughput:7.1f} requests/s   x{throughput / baseline:.2f}   "
+                  f"{wrong} wrong of {args.requests}")
+    finally:
+        server.shutdown()
+
+
+def synthetic_faces(models_path, count, seed=0):
+    """Augmented 200x200 face crops derived from the gallery photos"""
+    import cv2
+    import numpy as np
+    from enrollment import run_enrollment, scan_gallery
+
+    base_faces = [result["face"] for result in run_enrollment(scan_gallery(models_path), ENROLLMENT_PARAMS).accepted]
+    rng = np.random.default_rng(seed)
+    faces = []
+    for i in range(count):
+        face = base_faces[i % len(base_faces)]
+        matrix = cv2.getRotationMatrix2D((100, 100), rng.uniform(-15, 15), rng.uniform(0.9, 1.1))
+        face = cv2.warpAffine(face, matrix, (200, 200), borderMode=cv2.BORDER_REFLECT)
+        noise = rng.integers(-12, 12, face.shape)
+        faces.append(np.clip(face.astype(np.int16) + noise, 0, 255).astype(np.uint8))
+    return faces
+
+
+def bench_match(args):
+    """Vectorized LBPH matcher against LBPHFaceRecognizer.predict()"""
+    import cv2
+    import numpy as np
+    from lbph_matcher import LBPHMatcher, compute_histograms
+
+    probes = synthetic_faces(args.models_path, args.probes, seed=1)
+    probe_histograms = compute_histograms(probes)
+
+    for size in args.sizes:
+        faces = synthetic_faces(args.models_path, size)
+        recognizer = cv2.face.LBPHFaceRecognizer_create()
+        recognizer.train(np.array(faces), np.arange(size))
+        matcher = LBPHMatcher.from_recognizer(recognizer)
+
+        start = time.perf_counter()
+        expected = [recognizer.predict(probe) for probe in probes]
+        opencv_ms = (time.perf_counter() - start) * 1000 / len(probes)
+
+        start = time.perf_counter()
+        actual = matcher.predict(probe_histograms)
+        numpy_ms = (time.perf_counter() - start) * 1000 / len(probes)
+
+        max_error = max(abs(e[1] - a[1]) for e, a in zip(expected, actual))
+        agree = sum(e[0] == a[0] for e, a in zip(expected, actual))
+        print(f"  gallery={size:<6} predict() {opencv_ms:8.2f} ms/probe   matcher {numpy_ms:8.2f} ms/probe   "
+              f"x{opencv_ms / numpy_ms:.1f}   labels {agree}/{len(probes)}   max |d| error {max_error:.2e}")
+
+
+def bench_verify(args):
+    """1:1 verification against one identity's columns vs 1:N identification"""
+    import numpy as np
+    from lbph_matcher import LBPHMatcher, compute_histograms
+
+    base = compute_histograms(synthetic_faces(args.models_path, 500))
+    probes = compute_histograms(synthetic_faces(args.models_path, args.probes, seed=1))
+
+    for size in args.sizes:
+        histograms = np.tile(base, (size // len(base) + 1, 1))[:size]
+        # Three photos per identity
+        matcher = LBPHMatcher(histograms, np.arange(size) // 3)
+
+        start = time.perf_counter()
+        matcher.search(probes, k=1)
+        search_ms = (time.perf_counter() - start) * 1000 / len(probes)
+
+        start = time.perf_counter()
+        for i, probe in enumerate(probes):
+            matcher.distances(probe, columns=matcher.columns_of(i % (size // 3))).min()
+        verify_ms = (time.perf_counter() - start) * 1000 / len(probes)
+        print(f"  gallery={size:<7} 1:N search {search_ms:8.2f} ms   1:1 verify {verify_ms:6.3f} ms   "
+              f"x{search_ms / verify_ms:.0f}")
+
+
+def bench_ann(args):
+    """Recall and latency of the IVF index against exact search"""
+    import numpy as np
+    from ann_index import IVFIndex
+    from lbph_matcher import LBPHMatcher, compute_histograms
+
+    print(f"Building a synthetic gallery of {args.size} samples...")
+    histograms = compute_histograms(synthetic_faces(args.models_path, args.size))
+    matcher = LBPHMatcher(histograms, np.arange(args.size))
+    probes = compute_histograms(synthetic_faces(args.models_path, args.probes, seed=1))
+
+    start = time.perf_counter()
+    index = IVFIndex(matcher, shortlist=args.shortlist)
+    print(f"  index build: {time.perf_counter() - start:.2f}s ({len(index.centroids)} lists)")
+
+    start = time.perf_counter()
+    exact = matcher.search(probes, args.k)
+    exact_ms = (time.perf_counter() - start) * 1000 / len(probes)
+    print(f"  exact search: {exact_ms:.2f} ms/probe")
+
+    for n_probe in args.n_probe:
+        start = time.perf_counter()
+        approximate = index.search(probes, args.k, n_probe=n_probe)
+        ann_ms = (time.perf_counter() - start) * 1000 / len(probes)
+
+        recall_1 = np.mean([a[:1] == e[:1] for a, e in zip(approximate, exact)])
+        recall_k = np.mean([len({label for label, _ in a} & {label for label, _ in e}) / len(e)
+                            for a, e in zip(approximate, exact)])
+        print(f"  n_probe={n_probe:<4} {ann_ms:8.2f} ms/probe   x{exact_ms / ann_ms:5.1f}   "
+              f"recall@1 {recall_1:.3f}   recall@{args.k} {recall_k:.3f}")
+
+
+def memory_usage(pid="self"):
+    """(private, shared) resident kB of a process, from /proc/<pid>/smaps_rollup"""
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1])
+    private = fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0)
+    shared = fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0)
+    return private, shared
+
+
+def bench_memory(args):
+    """Resident memory of workers sharing one memory-mapped gallery"""
+    import multiprocessing
+    import tempfile
+    import numpy as np
+    from lbph_matcher import LBPHMatcher, compute_histograms
+
+    faces = synthetic_faces(args.models_path, min(args.size, 500))
+    histograms = compute_histograms(faces)
+    histograms = np.tile(histograms, (args.size // len(histograms) + 1, 1))[:args.size]
+    probe = histograms[:1]
+
+    def worker(directory, mmap_mode, results):
+        before = memory_usage()[0]
+        matcher = LBPHMatcher.load(directory, mmap_mode=mmap_mode)
+        matcher.search(probe, k=5)
+        private, shared = memory_usage()
+        results.put((private - before, shared))
+
+    with tempfile.TemporaryDirectory() as directory:
+        LBPHMatcher(histograms, np.arange(args.size)).save(directory)
+        del histograms
+        gallery_mb = os.path.getsize(os.path.join(directory, "gallery_t.npy")) / 2**20
+        print(f"Gallery of {args.size} samples: {gallery_mb:.0f} MB on disk, {args.workers} workers")
+
+        context = multiprocessing.get_context("fork")
+        for label, mmap_mode in (("copied", None), ("memory-mapped", "r")):
+            results = context.Queue()
+            workers = [context.Process(target=worker, args=(directory, mmap_mode, results))
+                       for _ in range(args.workers)]
+            for process in workers:
+                process.start()
+            usage = [results.get() for _ in workers]
+            for process in workers:
+                process.join()
+            private = sum(u[0] for u in usage) / len(usage) / 1024
+            shared = sum(u[1] for u in usage) / len(usage) / 1024
+            print(f"  {label:<14} private +{private:7.1f} MB/worker   shared {shared:7.1f} MB/worker   "
+                  f"total private {private * args.workers:7.1f} MB")
+
+
+# Loads the real gunicorn.conf.py and reports when each worker has the app loaded
+GUNICORN_BENCH_CONF = """
+import os, time
+exec(open(os.path.join({model_dir!r}, "gunicorn.conf.py")).read())
+def post_worker_init(worker):
+    print(f"worker-ready {{os.getpid()}} {{time.time()}}", flush=True)
+"""
+
+
+def bench_preload(args):
+    """Worker spawn time and memory of gunicorn with and without preload_app"""
+    import base64
+    import json
+    import signal
+    import subprocess
+    import tempfile
+    import urllib.request
+
+    image = next(entry for entry in sorted(os.listdir(args.models_path)) if entry.endswith(".jpg"))
+    with open(os.path.join(args.models_path, image), "rb") as f:
+        body = json.dumps({"image": base64.b64encode(f.read()).decode("ascii")}).encode("utf-8")
+
+    with tempfile.NamedTemporaryFile("w", suffix=".py") as conf:
+        conf.write(GUNICORN_BENCH_CONF.format(model_dir=MODEL_DIR))
+        conf.flush()
+
+        for preload in ("0", "1"):
+            env = {**os.environ, "FACETRUST_PRELOAD": preload, "WEB_CONCURRENCY": str(args.workers),
+                   "PORT": str(args.port), "PYTHONUNBUFFERED": "1"}
+            start = time.time()
+            server = subprocess.Popen([sys.executable, "-m", "gunicorn", "--config", conf.name, "web_interface:app"],
+                                      cwd=MODEL_DIR, env=env, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                      text=True)
+            try:
+                ready = {}
+                for line in server.stdout:
+                    if line.startswith("worker-ready"):
+                        _, pid, timestamp = line.split()
+                        ready[int(pid)] = float(timestamp)
+                        if len(ready) == args.workers:
+                            break
+                spawn = max(ready.values()) - start
+
+                # Exercise every worker so memory reflects a serving process
+                for _ in range(args.requests):
+                    request = urllib.request.Request(f"http://127.0.0.1:{args.port}/recognize", data=body,
+                                                     headers={"Content-Type": "application/json"})
+                    urllib.request.urlopen(request).read()
+
+                usage = [memory_usage(pid) for pid in ready]
+                private = sum(u[0] for u in usage) / 1024
+                print(f"  preload={preload}  all {args.workers} workers ready after {spawn:5.2f}s   "
+                      f"private {private / args.workers:6.1f} MB/worker   total private {private:7.1f} MB")
+            finally:
+                server.send_signal(signal.SIGTERM)
+                server.communicate(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="FaceTrust AI performance benchmarks")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    enroll = subparsers.add_parser("enroll", help=bench_enroll.__doc__)
+    enroll.add_argument("--models-path", default=DEFAULT_MODELS_PATH)
+    enroll.add_argument("--replicate", type=int, default=50,
+                        help="Repeat the gallery N times to simulate a large enrollment set")
+    enroll.add_argument("--cache", action="store_true",
+                        help="Also time a cold and a warm run with the detection cache")
+    enroll.set_defaults(func=bench_enroll)
+
+    detect = subparsers.add_parser("detect", help=bench_detect.__doc__)
+    detect.add_argument("--models-path", default=DEFAULT_MODELS_PATH)
+    detect.add_argument("--heights", type=int, nargs="+", default=[480, 720, 1080, 1440, 2160])
+    detect.add_argument("--max-side", type=int, default=640)
+    detect.add_argument("--repeat", type=int, default=3)
+    detect.set_defaults(func=bench_detect)
+
+    detectors = subparsers.add_parser("detectors", help=bench_detectors.__doc__)
+    detectors.add_argument("--models-path", default=DEFAULT_MODELS_PATH)
+    detectors.add_argument("--images", default=DEFAULT_MODELS_PATH,
+                           help="Directory of photos showing exactly one face each")
+    detectors.add_argument("--variants", type=int, default=10,
+                           help="Rotated/scaled/relit variants generated per photo")
+    detectors.set_defaults(func=bench_detectors)
+
+    primary = subparsers.add_parser("primary", help=bench_primary.__doc__)
+    primary.add_argument("--models-path", default=DEFAULT_MODELS_PATH)
+    primary.add_argument("--heights", type=int, nargs="+", default=[480, 720, 1080])
+    primary.add_argument("--repeat", type=int, default=3)
+    primary.set_defaults(func=bench_primary)
+
+    prefilter = subparsers.add_parser("prefilter", help=bench_prefilter.__doc__)
+    prefilter.add_argument("--models-path", default=DEFAULT_MODELS_PATH)
+    prefilter.add_argument("--heights", type=int, nargs="+", default=[480, 1080])
+    prefilter.add_argument("--repeat", type=int, default=5)
+    prefilter.set_defaults(func=bench_prefilter)
+
+    cache = subparsers.add_parser("cache", help=bench_cache.__doc__)
+    cache.add_argument("--models-path", default=DEFAULT_MODELS_PATH)
+    cache.add_argument("--frames", type=int, default=40)
+    cache.add_argument("--threads", type=int, default=4)
+    cache.set_defaults(func=bench_cache)
+
+    upload = subparsers.add_parser("upload", help=bench_upload.__doc__)
+    upload.add_argument("--heights", type=int, nargs="+", default=[720, 1080, 2160])
+    upload.add_argument("--repeat", type=int, default=10)
+    upload.set_defaults(func=bench_upload)
+
+    decode = subparsers.add_parser("decode", help=bench_decode.__doc__)
+    decode.add_argument("--models-path", default=DEFAULT_MODELS_PATH)
+    decode.add_argument("--heights", type=int, nargs="+", default=[720, 1080, 2160])
+    decode.add_argument("--max-side", type=int, default=640)
+    decode.add_argument("--repeat", type=int, default=10)
+    decode.set_defaults(func=bench_decode)
+
+    identity = subparsers.add_parser("identity", help=bench_identity.__doc__)
+    identity.add_argument("--models-path", default=DEFAULT_MODELS_PATH)
+    identity.add_argument("--repeat", type=int, default=5000)
+    identity.set_defaults(func=bench_identity)
+
+    log = subparsers.add_parser("logging", help=bench_logging.__doc__)
+    log.add_argument("--models-path", default=DEFAULT_MODELS_PATH)
+    log.add_argument("--repeat", type=int, default=40)
+    log.add_argument("--write-latency", type=float, default=0.5, help="ms each stdout write blocks")
+    log.set_defaults(func=bench_logging)
+
+    stream = subparsers.add_parser("stream", help=bench_stream.__doc__)
+    stream.add_argument("--models-path", default=DEFAULT_MODELS_PATH)
+    stream.add_argument("--fps", type=float, default=30)
+    stream.add_argument("--seconds", type=float, default=5)
+    stream.add_argument("--port", type=int, default=5097)
+    stream.set_defaults(func=bench_stream)
+
+    slow = subparsers.add_parser("slow", help=bench_slow.__doc__)
+    slow.add_argument("--models-path", default=DEFAULT_MODELS_PATH)
+    slow.add_argument("--slow-clients", type=int, default=50)
+    slow.add_argument("--rate", type=float, default=20000, help="upload bytes/s per slow client")
+    slow.add_argument("--seconds", type=float, default=5, help="how long the fast client keeps sending")
+    slow.add_argument("--port", type=int, default=5098)
+    slow.set_defaults(func=bench_slow)
+
+    batch = subparsers.add_parser("batch", help=bench_batch.__doc__)
+    batch.add_argument("--models-path", default=DEFAULT_MODELS_PATH)
+    batch.add_argument("--images", type=int, default=32)
+    batch.set_defaults(func=bench_batch)
+
+    stress = subparsers.add_parser("stress", help=bench_stress.__doc__)
+    stress.add_argument("--models-path", default=DEFAULT_MODELS_PATH)
+    stress.add_argument("--requests", type=int, default=64)
+    stress.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8])
+    stress.add_argument("--port", type=int, default=5078)
+    stress.set_defaults(func=bench_stress)
+
+    match = subparsers.add_parser("match", help=bench_match.__doc__)
+    match.add_argument("--models-path", default=DEFAULT_MODELS_PATH)
+    match.add_argument("--sizes", type=int, nargs="+", default=[100, 500, 1000, 2000])
+    match.add_argument("--probes", type=int, default=10)
+    match.set_defaults(func=bench_match)
+
+    verify = subparsers.add_parser("verify", help=bench_verify.__doc__)
+    verify.add_argument("--models-path", default=DEFAULT_MODELS_PATH)
+    verify.add_argument("--sizes", type=int, nargs="+", default=[300, 3000, 10000])
+    verify.add_argument("--probes", type=int, default=20)
+    verify.set_defaults(func=bench_verify)
+
+    ann = subparsers.add_parser("ann", help=bench_ann.__doc__)
+    ann.add_argument("--models-path", default=DEFAULT_MODELS_PATH)
+    ann.add_argument("--size", type=int, default=5000)
+    ann.add_argument("--probes", type=int, default=50)
+    ann.add_argument("--k", type=int, default=5)
+    ann.add_argument("--shortlist", type=int, default=128)
+    ann.add_argument("--n-probe", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    ann.set_defaults(func=bench_ann)
+
+    memory = subparsers.add_parser("memory", help=bench_memory.__doc__)
+    memory.add_argument("--models-path", default=DEFAULT_MODELS_PATH)
+    memory.add_argument("--size", type=int, default=5000)
+    memory.add_argument("--workers", type=int, default=4)
+    memory.set_defaults(func=bench_memory)
+
+    preload = subparsers.add_parser("preload", help=bench_preload.__doc__)
+    preload.add_argument("--models-path", default=DEFAULT_MODELS_PATH)
+    preload.add_argument("--workers", type=int, default=4)
+    preload.add_argument("--requests", type=int, default=20)
+    preload.add_argument("--port", type=int, default=5077)
+    preload.set_defaults(func=bench_preload)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
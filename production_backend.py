@@ -22,15 +22,12 @@ import threading
 import time
 import signal
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('backend.log'),
-        logging.StreamHandler(sys.stdout)
-    ]
-)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src", "model"))
+import log_config
+
+# Configure logging: queued writes to stdout and a size-rotated backend.log
+# (FACETRUST_LOG_* settings, see src/model/log_config.py)
+log_config.configure(log_file='backend.log')
 logger = logging.getLogger(__name__)
 
 class ProductionFaceRecognitionServer:
@@ -21,12 +21,13 @@ try:
     
     # Import the face model and web interface
     from face_model import FaceRecognitionModel
+    from image_io import ImagePayloadError, decode_request_frame, scale_boxes
+    import log_config
     from flask import Flask, request, jsonify
     from flask_cors import CORS
-    import base64
-    import cv2
-    import numpy as np
-    import json
+    
+    # Queued, sampled JSON logging (FACETRUST_LOG_* settings)
+    log_config.configure()
     
     # Initialize Flask app
     app = Flask(__name__)
@@ -34,7 +35,7 @@ try:
     
     # Initialize face recognition model
     print("Initializing Face Recognition Model...")
-    face_model = FaceRecognitionModel()
+    face_model = FaceRecognitionModel(watch_interval=float(os.environ.get("FACETRUST_WATCH_INTERVAL", 5)))
     
     @app.route('/')
     def home():
@@ -80,27 +81,14 @@ try:
                     "known_faces": len(face_model.class_names)
                 }), 400
             
-            data = request.get_json()
-            
-            if 'image' not in data:
-                return jsonify({"error": "No image data provided"}), 400
-            
-            # Decode base64 image
-            image_data = data['image']
-            if image_data.startswith('data:image'):
-                # Remove data URL prefix
-                image_data = image_data.split(',')[1]
-            
-            # Convert base64 to numpy array
-            image_bytes = base64.b64decode(image_data)
-            nparr = np.frombuffer(image_bytes, np.uint8)
-            img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-            
-            if img is None:
-                return jsonify({"error": "Could not decode image"}), 400
+            # Raw image/* body, multipart upload or base64 JSON
+            try:
+                img, scale = decode_request_frame(request, face_model.detection_max_side)
+            except ImagePayloadError as e:
+                return jsonify({"error": str(e)}), e.status
             
             # Recognize face
-            result = face_model.recognize_face_from_image(img)
+            result = scale_boxes(face_model.recognize_face_from_image(img), scale)
             
             # Format response for frontend
             if result.get("success") and result.get("faces_found", 0) > 0:
@@ -124,12 +112,7 @@ try:
                             "avatar": team_data.get("avatar", ""),
                         },
                         "processing_time": 0.5,
-                        "image_quality": {
-                            "brightness": 0.8,
-                            "sharpness": 0.9,
-                            "face_size": 0.7,
-                            "angle_quality": 0.8
-                        }
+                        "image_quality": face_result["image_quality"]
                     }
                     return jsonify(response)
                 else:
@@ -140,12 +123,7 @@ try:
                         "liveness": 0.8,
                         "reason": "Face not recognized as team member",
                         "processing_time": 0.5,
-                        "image_quality": {
-                            "brightness": 0.8,
-                            "sharpness": 0.9,
-                            "face_size": 0.7,
-                            "angle_quality": 0.8
-                        }
+                        "image_quality": face_result["image_quality"]
                     })
             else:
                 # No face detected
@@ -153,8 +131,9 @@ try:
                     "matched": False,
                     "confidence": 0.0,
                     "liveness": 0.0,
-                    "reason": "No face detected in the image",
-                    "processing_time": 0.3
+                    "reason": result.get("rejected", "No face detected in the image"),
+                    "processing_time": 0.3,
+                    "image_quality": result.get("image_quality")
                 })
         
         except Exception as e:
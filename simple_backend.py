@@ -6,19 +6,21 @@ Provides basic face recognition API endpoints
 
 from flask import Flask, request, jsonify, send_from_directory
 from flask_cors import CORS
-import base64
-import io
 import json
+import sys
 import time
 import cv2
 import numpy as np
 import face_recognition
 import os
-from PIL import Image
 import logging
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src", "model"))
+from image_io import ImagePayloadError, decode_image_buffer, decode_request_image
+import log_config
+
+# Configure logging (FACETRUST_LOG_* settings, see src/model/log_config.py)
+log_config.configure()
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
@@ -79,30 +81,13 @@ def load_sample_team():
     logger.info(f"✓ Loaded {len(known_face_names)} team members: {known_face_names}")
     logger.info("✓ Model ready for face recognition")
 
-def decode_base64_image(image_data):
-    """Decode base64 image data to numpy array"""
-    try:
-        # Remove data URL prefix if present
-        if image_data.startswith('data:image'):
-            image_data = image_data.split(',')[1]
-        
-        # Decode base64
-        image_bytes = base64.b64decode(image_data)
-        
-        # Convert to PIL Image
-        pil_image = Image.open(io.BytesIO(image_bytes))
-        
-        # Convert to RGB if necessary
-        if pil_image.mode != 'RGB':
-            pil_image = pil_image.convert('RGB')
-        
-        # Convert to numpy array
-        image_array = np.array(pil_image)
-        
-        return image_array
-    except Exception as e:
-        logger.error(f"Error decoding image: {e}")
+def decode_rgb_image(buffer):
+    """Decode encoded image bytes to an RGB numpy array, None if invalid"""
+    image = decode_image_buffer(buffer)
+    if image is None:
         return None
+    # face_recognition expects RGB; swap the channels in place
+    return cv2.cvtColor(image, cv2.COLOR_BGR2RGB, dst=image)
 
 def analyze_image_quality(image):
     """Analyze image quality metrics"""
@@ -166,22 +151,15 @@ def recognize_face():
     start_time = time.time()
     
     try:
-        data = request.get_json()
-        if not data or 'image' not in data:
-            return jsonify({
-                "matched": False,
-                "reason": "No image data provided",
-                "processing_time": int((time.time() - start_time) * 1000)
-            }), 400
-        
-        # Decode the image
-        image = decode_base64_image(data['image'])
-        if image is None:
+        # Raw image/* body, multipart upload or base64 JSON (see image_io)
+        try:
+            image = decode_request_image(request, decode=decode_rgb_image)
+        except ImagePayloadError as e:
             return jsonify({
                 "matched": False,
-                "reason": "Invalid image format",
+                "reason": str(e),
                 "processing_time": int((time.time() - start_time) * 1000)
-            }), 400
+            }), e.status
         
         # Analyze image quality
         image_quality = analyze_image_quality(image)
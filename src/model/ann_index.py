@@ -0,0 +1,143 @@
+import numpy as np
+
+from lbph_matcher import top_identities
+
+
+def fit_pca(samples, n_components, seed=0, power_iterations=2):
+    """Mean and top principal axes (bins x components) via randomized SVD"""
+    mean = samples.mean(axis=0)
+    centered = samples - mean
+    rng = np.random.default_rng(seed)
+
+    n_components = min(n_components, *centered.shape)
+    sketch = centered @ rng.standard_normal((centered.shape[1], n_components + 10)).astype(np.float32)
+    for _ in range(power_iterations):
+        sketch, _ = np.linalg.qr(sketch)
+        sketch = centered @ (centered.T @ sketch)
+    basis, _ = np.linalg.qr(sketch)
+
+    _, _, vt = np.linalg.svd(basis.T @ centered, full_matrices=False)
+    return mean.astype(np.float32), np.ascontiguousarray(vt[:n_components].T, dtype=np.float32)
+
+
+def squared_distances(points, centers):
+    """Pairwise squared Euclidean distances (points x centers)"""
+    result = (points * points).sum(axis=1)[:, None] - 2.0 * (points @ centers.T)
+    result += (centers * centers).sum(axis=1)[None, :]
+    return result
+
+
+def kmeans(points, k, iterations=12, seed=0, chunk=16384):
+    """Plain Lloyd k-means; returns (centroids, assignment)"""
+    rng = np.random.default_rng(seed)
+    centroids = points[rng.choice(len(points), k, replace=False)].copy()
+    assignment = np.zeros(len(points), dtype=np.int64)
+
+    for _ in range(iterations):
+        for start in range(0, len(points), chunk):
+            block = points[start:start + chunk]
+            assignment[start:start + chunk] = squared_distances(block, centroids).argmin(axis=1)
+
+        order = np.argsort(assignment, kind="stable")
+        counts = np.bincount(assignment, minlength=k)
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        occupied = counts > 0
+        sums = np.add.reduceat(points[order], starts[occupied], axis=0)
+        centroids[occupied] = sums / counts[occupied, None]
+        # Re-seed empty lists on random points so every list stays useful
+        empty = np.flatnonzero(~occupied)
+        if len(empty):
+            centroids[empty] = points[rng.choice(len(points), len(empty), replace=False)]
+
+    return centroids, assignment
+
+
+class IVFIndex:
+    """Approximate nearest-neighbour index over an `LBPHMatcher` gallery
+
+    Histograms are square-rooted (so Euclidean distance tracks the chi-square
+    family of histogram distances), projected onto their top principal axes
+    and clustered into `n_lists` inverted lists. A query visits the `n_probe`
+    lists with the closest centroids, keeps the `shortlist` candidates closest
+    in the reduced space and re-ranks those with the matcher's exact distance.
+
+    `n_probe` and `shortlist` are the recall/latency knobs: raising either
+    moves results closer to exact search at a higher cost per query.
+    """
+
+    def __init__(self, matcher, n_components=64, n_lists=None, n_probe=8, shortlist=128,
+                 train_size=8192, iterations=12, seed=0):
+        self.matcher = matcher
+        self.n_probe = n_probe
+        self.shortlist = shortlist
+
+        histograms = matcher.histograms
+        count = len(histograms)
+        rng = np.random.default_rng(seed)
+        train_rows = np.sort(rng.choice(count, min(count, train_size), replace=False))
+        training = np.sqrt(np.asarray(histograms[train_rows], dtype=np.float32))
+
+        self.mean, self.components = fit_pca(training, n_components, seed)
+
+        codes = self.transform(histograms)
+        n_lists = n_lists or max(1, int(np.sqrt(count)))
+        n_lists = min(n_lists, count)
+        self.centroids, _ = kmeans(codes[train_rows], n_lists, iterations, seed)
+
+        # Each list is an (ids, codes) tuple replaced whole on update, so a
+        # reader never sees ids and codes of different lengths
+        self._lists = [(np.zeros(0, dtype=np.int64), np.zeros((0, codes.shape[1]), dtype=np.float32))
+                       for _ in range(n_lists)]
+        self.size = 0
+        self._insert(codes, np.arange(count))
+
+    def transform(self, histograms, chunk=4096):
+        """Project histograms into the reduced search space"""
+        histograms = np.asarray(histograms, dtype=np.float32).reshape(-1, len(self.mean))
+        codes = np.empty((len(histograms), self.components.shape[1]), dtype=np.float32)
+        for start in range(0, len(histograms), chunk):
+            block = np.sqrt(histograms[start:start + chunk]) - self.mean
+            codes[start:start + chunk] = block @ self.components
+        return codes
+
+    def _insert(self, codes, ids):
+        assignment = squared_distances(codes, self.centroids).argmin(axis=1)
+        for list_id in np.unique(assignment):
+            members = assignment == list_id
+            list_ids, list_codes = self._lists[list_id]
+            self._lists[list_id] = (np.concatenate((list_ids, ids[members])),
+                                    np.concatenate((list_codes, codes[members])))
+        self.size += len(ids)
+
+    def add(self, histograms, ids):
+        """Index samples already appended to the matcher; callers serialize writers"""
+        self._insert(self.transform(histograms), np.asarray(ids, dtype=np.int64))
+
+    def search(self, probe_histograms, k=5, n_probe=None, shortlist=None):
+        """Approximate `LBPHMatcher.search`: sorted (label, distance) lists per probe"""
+        n_probe = min(n_probe or self.n_probe, len(self._lists))
+        shortlist = shortlist or self.shortlist
+        probes = np.asarray(probe_histograms, dtype=np.float32).reshape(-1, len(self.mean))
+        codes = self.transform(probes)
+
+        results = []
+        for probe, code in zip(probes, codes):
+            centroid_distances = squared_distances(code[None, :], self.centroids)[0]
+            nearest_lists = np.argpartition(centroid_distances, n_probe - 1)[:n_probe]
+            visited = [self._lists[list_id] for list_id in nearest_lists]
+            ids = np.concatenate([list_ids for list_ids, _ in visited])
+
+            if len(ids) > shortlist:
+                list_codes = np.concatenate([list_codes for _, list_codes in visited])
+                coarse = squared_distances(code[None, :], list_codes)[0]
+                ids = ids[np.argpartition(coarse, shortlist - 1)[:shortlist]]
+
+            if len(ids) == 0:
+                results.append([])
+                continue
+
+            # Read after the lists: ids are only indexed once the matcher holds them
+            labels = self.matcher.labels
+            exact = self.matcher.distances(probe, columns=ids)[0]
+            results.append(top_identities(exact, labels[ids], k))
+        return results
@@ -0,0 +1,206 @@
+"""
+asyncio (ASGI) serving mode for the FaceTrust AI API
+
+    pip install uvicorn
+    cd src/model && uvicorn asgi_app:app --host 0.0.0.0 --port 5000
+    cd src/model && python asgi_app.py        # the same, PORT / WEB_CONCURRENCY apply
+
+Serves the routes of web_interface with the same responses. Request bodies
+are read on the event loop, so a client uploading over a slow link costs a
+coroutine and its buffer rather than a worker. Only complete requests reach
+the thread pool that runs decoding and recognition: cpu_share() threads, with
+at most FACETRUST_MAX_PENDING requests (64 per thread by default, about a
+second of recognition work) running or waiting for it; beyond that the server
+answers 503 immediately rather than queueing without bound.
+GET, HEAD and OPTIONS requests never do CV work and are answered on the loop.
+Uploads that take longer than FACETRUST_UPLOAD_TIMEOUT seconds (60) get a 408.
+"""
+import asyncio
+import io
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import web_interface
+from image_io import MAX_IMAGE_BYTES
+from runtime_config import cpu_share
+
+UPLOAD_TIMEOUT = float(os.environ.get("FACETRUST_UPLOAD_TIMEOUT", 60))
+
+# Largest request body read: an image of MAX_IMAGE_BYTES sent as base64 JSON
+MAX_BODY_BYTES = MAX_IMAGE_BYTES * 4 // 3 + 64 * 1024
+
+# Methods served on the event loop; everything else runs on the executor
+INLINE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+class ClientGone(Exception):
+    """The client disconnected before its request body was complete"""
+
+
+class BoundedExecutor:
+    """Thread pool that refuses work once `max_pending` requests are running or waiting
+
+    Only used from the event loop thread, so the counter needs no lock.
+    """
+
+    def __init__(self, threads, max_pending):
+        self.threads = threads
+        self.max_pending = max_pending
+        self.pending = 0
+        self.rejected = 0
+        self._pool = None
+
+    async def run(self, function, *args):
+        """`function(*args)` on the pool, None when the pool is saturated"""
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            return None
+        if self._pool is None:
+            # Created on first use so that the threads start in the serving process
+            self._pool = ThreadPoolExecutor(self.threads, thread_name_prefix="recognize")
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._pool, function, *args)
+        finally:
+            self.pending -= 1
+
+    def stats(self):
+        return {"threads": self.threads, "max_pending": self.max_pending, "pending": self.pending,
+                "rejected": self.rejected}
+
+
+executor = BoundedExecutor(cpu_share(), int(os.environ.get("FACETRUST_MAX_PENDING", 64 * cpu_share())))
+web_interface.status_sources["executor"] = executor.stats
+
+
+def wsgi_environ(scope, body):
+    """WSGI environ for an ASGI HTTP scope whose body has been read completely"""
+    server = scope.get("server") or ("localhost", 80)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope["query_string"].decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope['http_version']}",
+        "CONTENT_LENGTH": str(len(body)),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    if scope.get("client"):
+        environ["REMOTE_ADDR"] = scope["client"][0]
+    for name, value in scope["headers"]:
+        name = name.decode("latin-1")
+        value = value.decode("latin-1")
+        if name in ("content-length", "transfer-encoding"):
+            # The body has already been read (and de-chunked) in full
+            continue
+        key = "CONTENT_TYPE" if name == "content-type" else "HTTP_" + name.upper().replace("-", "_")
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+def call_wsgi(environ):
+    """(status code, headers, body) of web_interface's Flask app for one request"""
+    started = []
+
+    def start_response(status, headers, exc_info=None):
+        started[:] = [int(status.split(" ", 1)[0]), headers]
+
+    chunks = web_interface.app(environ, start_response)
+    try:
+        body = b"".join(chunks)
+    finally:
+        if hasattr(chunks, "close"):
+            chunks.close()
+    return started[0], started[1], body
+
+
+async def read_body(receive, limit):
+    body = bytearray()
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            raise ClientGone()
+        body += message.get("body", b"")
+        if len(body) > limit:
+            raise ValueError(f"Request body larger than {limit} bytes")
+        if not message.get("more_body", False):
+            return bytes(body)
+
+
+async def send_response(send, status, headers, body):
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+async def send_json(send, status, payload, headers=()):
+    body = json.dumps(payload).encode("utf-8")
+    await send_response(send, status, [("Content-Type", "application/json"),
+                                       ("Access-Control-Allow-Origin", "*"), *headers], body)
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        return await lifespan(receive, send)
+    if scope["type"] != "http":
+        # /recognize/stream needs the WSGI server (flask-sock)
+        if scope["type"] == "websocket":
+            await send({"type": "websocket.close", "code": 1003})
+        return
+
+    length = dict(scope["headers"]).get(b"content-length")
+    if length is not None and length.isdigit() and int(length) > MAX_BODY_BYTES:
+        return await send_json(send, 413, {"matched": False, "confidence": 0.0, "identity": None,
+                                           "reason": f"Request body larger than {MAX_BODY_BYTES} bytes"})
+    try:
+        body = await asyncio.wait_for(read_body(receive, MAX_BODY_BYTES), UPLOAD_TIMEOUT)
+    except ClientGone:
+        return
+    except asyncio.TimeoutError:
+        return await send_json(send, 408, {"matched": False, "confidence": 0.0, "identity": None,
+                                           "reason": f"Upload not completed within {UPLOAD_TIMEOUT:g}s"})
+    except ValueError as e:
+        return await send_json(send, 413, {"matched": False, "confidence": 0.0, "identity": None, "reason": str(e)})
+
+    environ = wsgi_environ(scope, body)
+    if scope["method"] in INLINE_METHODS:
+        response = call_wsgi(environ)
+    else:
+        response = await executor.run(call_wsgi, environ)
+        if response is None:
+            return await send_json(send, 503, {"matched": False, "confidence": 0.0, "identity": None,
+                                               "reason": "Server busy, retry shortly"}, [("Retry-After", "1")])
+    await send_response(send, *response)
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    # log_config=None: uvicorn's records go through log_config's queue like the app's
+    uvicorn.run("asgi_app:app", host="0.0.0.0", port=int(os.environ.get("PORT", 5000)),
+                workers=int(os.environ.get("WEB_CONCURRENCY", 1)), log_config=None)
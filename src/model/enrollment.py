@@ -0,0 +1,312 @@
+import hashlib
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+from collections import Counter, namedtuple
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from face_detectors import create_detector, detect_primary
+from image_io import read_for_recognition
+from runtime_config import cpu_budget
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+# Below this many images the pool start-up cost outweighs the parallel speed-up
+MIN_PARALLEL_IMAGES = 8
+
+# Parameters that change what the detector returns; cached detections are only
+# reused when all of them match
+DETECTION_PARAM_KEYS = ("detector", "detector_params", "detection_max_side", "min_face_size",
+                        "primary_min_face_fraction")
+
+# Bump when decoding or detection changes the boxes for the same parameters;
+# cached boxes are in the decoded (possibly reduced) photo's coordinates
+DETECTION_CACHE_VERSION = 2
+
+GalleryImage = namedtuple("GalleryImage", ["path", "file_name", "name", "size", "mtime_ns"])
+
+_worker_detectors = {}
+
+
+def scan_gallery(models_path):
+    """List gallery images with a single directory scan, sorted by file name"""
+    entries = []
+    with os.scandir(models_path) as it:
+        for entry in it:
+            if not entry.is_file() or not entry.name.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            stat = entry.stat()
+            entries.append(GalleryImage(
+                path=entry.path,
+                file_name=entry.name,
+                # Extra photos of a member are stored as "Name__2.jpg", "Name__3.jpg", ...
+                name=os.path.splitext(entry.name)[0].split("__", 1)[0],
+                size=stat.st_size,
+                mtime_ns=stat.st_mtime_ns
+            ))
+    entries.sort(key=lambda e: e.file_name)
+    return entries
+
+
+def available_cpus():
+    """Number of CPUs this process can use: its affinity set capped by the cgroup CPU quota"""
+    return cpu_budget()
+
+
+def validate_face_quality(face_roi, min_face_size):
+    """Validate face image quality"""
+    try:
+        height, width = face_roi.shape
+        if height < min_face_size or width < min_face_size:
+            return False, "Face too small"
+
+        brightness = np.mean(face_roi)
+        if brightness < 30 or brightness > 220:
+            return False, "Poor lighting"
+
+        laplacian_var = cv2.Laplacian(face_roi, cv2.CV_64F).var()
+        if laplacian_var < 50:
+            return False, "Image too blurry"
+
+        contrast = face_roi.std()
+        if contrast < 15:
+            return False, "Low contrast"
+
+        return True, "Good quality"
+
+    except Exception as e:
+        return False, f"Quality check failed: {str(e)}"
+
+
+def _get_detector(name):
+    """Per-process detector, loaded once and reused for every image"""
+    if name not in _worker_detectors:
+        _worker_detectors[name] = create_detector(name)
+    return _worker_detectors[name]
+
+
+def _init_worker():
+    # Parallelism comes from the pool; nested OpenCV threads would oversubscribe
+    cv2.setNumThreads(1)
+
+
+class DetectionCache:
+    """Sidecar JSON cache of detection results for unchanged enrollment images
+
+    Entries are keyed by file name, size, modification time and a digest of
+    the detection parameters, and hold the chosen bounding box and quality
+    verdict, so a retrain only runs the cascade on new or modified photos.
+    """
+
+    def __init__(self, path, params):
+        self.path = Path(path)
+        detection_params = {key: params.get(key) for key in DETECTION_PARAM_KEYS}
+        detection_params["version"] = DETECTION_CACHE_VERSION
+        self.params_digest = hashlib.sha256(
+            json.dumps(detection_params, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+        self.entries = {}
+        self.updated = {}
+        self.hits = 0
+        self.misses = 0
+
+        try:
+            with open(self.path, "r") as f:
+                self.entries = json.load(f)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"⚠ Ignoring unreadable detection cache {self.path.name}: {str(e)}")
+
+    def key(self, entry):
+        return f"{entry.file_name}|{entry.size}|{entry.mtime_ns}|{self.params_digest}"
+
+    def lookup(self, entry):
+        detection = self.entries.get(self.key(entry))
+        if detection is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return detection
+
+    def store(self, result):
+        """Remember the detection outcome of a processed image"""
+        if result["error"] and result["error"] != "No face detected":
+            return  # Decode and processing failures are worth retrying
+        self.updated[self.key(result["entry"])] = {
+            "bounding_box": result["bounding_box"],
+            "quality_ok": bool(result["quality_ok"]),
+            "quality_msg": result["quality_msg"]
+        }
+
+    def save(self):
+        """Write the entries of this run (dropping removed images) atomically
+
+        Each writer uses its own temporary file, so concurrent saves from
+        several processes never interleave; the last rename wins.
+        """
+        tmp_path = None
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(prefix=f".{self.path.stem}-", suffix=".tmp", dir=self.path.parent)
+            with os.fdopen(fd, "w") as f:
+                json.dump(self.updated, f)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            print(f"⚠ Could not save detection cache: {str(e)}")
+            if tmp_path is not None and os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+
+
+def process_image(task):
+    """Decode, detect and crop one enrollment image (runs inside a pool worker)
+
+    With a cached detection the cascade is skipped and the cached box is cropped.
+    """
+    entry, params, cached = task
+    timings = {}
+    result = {"entry": entry, "face": None, "bounding_box": None, "cached": cached is not None,
+              "quality_ok": False, "quality_msg": None, "error": None, "timings": timings}
+
+    try:
+        start = time.perf_counter()
+        # Decoded by the same function as recognition frames (LBP codes are
+        # sensitive to the small differences between decoders), so a gallery
+        # photo submitted for recognition yields the same pixels
+        decoded = read_for_recognition(entry.path, params.get("detection_max_side"))
+        timings["decode"] = time.perf_counter() - start
+        if decoded is None:
+            result["error"] = "Could not load image"
+            return result
+        # Large photos are decoded reduced; face sizes are in the photo's pixels
+        gray, scale = decoded
+        min_face_size = params["min_face_size"] / scale
+
+        if cached is not None:
+            if cached["bounding_box"] is None:
+                result["error"] = "No face detected"
+                return result
+            start = time.perf_counter()
+            x, y, w, h = cached["bounding_box"]
+            result["face"] = cv2.resize(gray[y:y+h, x:x+w], tuple(params["face_size"]))
+            result["bounding_box"] = [x, y, w, h]
+            result["quality_ok"], result["quality_msg"] = cached["quality_ok"], cached["quality_msg"]
+            timings["crop"] = time.perf_counter() - start
+            return result
+
+        start = time.perf_counter()
+        # The largest face, found the way primary-face recognition finds it,
+        # so a gallery photo submitted for recognition gets an identical crop
+        detected_faces = detect_primary(_get_detector(params["detector"]), gray, min_face_size,
+                                        params.get("detection_max_side"), params.get("primary_min_face_fraction", 0.0))
+        timings["detect"] = time.perf_counter() - start
+        if len(detected_faces) == 0:
+            result["error"] = "No face detected"
+            return result
+
+        start = time.perf_counter()
+        (x, y, w, h) = detected_faces[0]
+        face_roi = gray[y:y+h, x:x+w]
+        result["quality_ok"], result["quality_msg"] = validate_face_quality(face_roi, min_face_size)
+        result["face"] = cv2.resize(face_roi, tuple(params["face_size"]))
+        result["bounding_box"] = [int(x), int(y), int(w), int(h)]
+        timings["crop"] = time.perf_counter() - start
+
+    except Exception as e:
+        result["error"] = f"Processing failed: {str(e)}"
+
+    return result
+
+
+class EnrollmentReport:
+    """Per-stage timings and per-image outcomes of an enrollment run"""
+
+    def __init__(self, total_images, workers):
+        self.total_images = total_images
+        self.workers = workers
+        self.accepted = []
+        self.failures = []
+        self.low_quality = []
+        self.stage_times = Counter()
+        self.wall_times = {}
+        self.cache_hits = None
+        self.cache_misses = None
+
+    def add(self, result):
+        self.stage_times.update(result["timings"])
+        if result["error"]:
+            self.failures.append((result["entry"].file_name, result["error"]))
+            return
+        if not result["quality_ok"]:
+            self.low_quality.append((result["entry"].file_name, result["quality_msg"]))
+        self.accepted.append(result)
+
+    def print_summary(self):
+        process_time = self.wall_times.get("process", 0.0)
+        throughput = self.total_images / process_time if process_time > 0 else 0.0
+
+        print(f"\nEnrollment Summary:")
+        print(f"  Images: {self.total_images} ({len(self.accepted)} accepted, {len(self.failures)} failed)")
+        print(f"  Workers: {self.workers}, throughput: {throughput:.1f} images/s")
+        if self.cache_hits is not None:
+            print(f"  Detection cache: {self.cache_hits} hits, {self.cache_misses} misses")
+        for stage in ("decode", "detect", "crop"):
+            print(f"  {stage:>7}: {self.stage_times[stage]:.2f}s CPU")
+        for stage, seconds in self.wall_times.items():
+            print(f"  {stage:>7}: {seconds:.2f}s wall")
+
+        if self.low_quality:
+            print(f"  ⚠ Accepted despite quality warnings: {len(self.low_quality)}")
+        if self.failures:
+            print(f"  Failure reasons: {dict(Counter(reason for _, reason in self.failures))}")
+            for file_name, reason in self.failures[:20]:
+                print(f"  ✗ {file_name}: {reason}")
+            if len(self.failures) > 20:
+                print(f"  ... and {len(self.failures) - 20} more")
+
+
+def run_enrollment(entries, params, workers=None, chunksize=None, cache=None):
+    """Process gallery images, in a process pool when it is worth it
+
+    With a `DetectionCache`, images it already knows skip detection, and the
+    cache is updated and saved with this run's results.
+    """
+    if workers is None:
+        workers = available_cpus()
+    workers = max(1, min(workers, len(entries)))
+
+    # Fork keeps worker start-up cheap and avoids re-importing the server module
+    # that created the model; platforms without fork process images serially.
+    if "fork" not in multiprocessing.get_all_start_methods() or len(entries) < MIN_PARALLEL_IMAGES:
+        workers = 1
+
+    report = EnrollmentReport(len(entries), workers)
+    tasks = [(entry, params, cache.lookup(entry) if cache else None) for entry in entries]
+    start = time.perf_counter()
+
+    if workers == 1:
+        for result in map(process_image, tasks):
+            report.add(result)
+            if cache is not None:
+                cache.store(result)
+    else:
+        if chunksize is None:
+            chunksize = max(1, min(64, len(entries) // (workers * 4)))
+        context = multiprocessing.get_context("fork")
+        with context.Pool(workers, initializer=_init_worker) as pool:
+            # imap streams crops back in gallery order as workers finish them
+            for result in pool.imap(process_image, tasks, chunksize=chunksize):
+                report.add(result)
+                if cache is not None:
+                    cache.store(result)
+
+    report.wall_times["process"] = time.perf_counter() - start
+
+    if cache is not None:
+        cache.save()
+        report.cache_hits, report.cache_misses = cache.hits, cache.misses
+    return report
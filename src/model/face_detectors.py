@@ -0,0 +1,164 @@
+import cv2
+import numpy as np
+
+DEFAULT_DETECTOR = "haar_default"
+
+
+class HaarDetector:
+    """Haar cascade from `cv2.data.haarcascades`"""
+
+    def __init__(self, cascade_file="haarcascade_frontalface_default.xml", scale_factor=1.1, min_neighbors=5):
+        self.cascade_file = cascade_file
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+        self.cascade = cv2.CascadeClassifier(cv2.data.haarcascades + cascade_file)
+        if self.cascade.empty():
+            raise ValueError(f"Could not load cascade '{cascade_file}'")
+
+    def params(self):
+        """Settings that change the detections, used to key caches and snapshots"""
+        return {"cascade": self.cascade_file, "scale_factor": self.scale_factor,
+                "min_neighbors": self.min_neighbors}
+
+    def detect(self, gray, min_size, max_size=None):
+        """Face boxes (x, y, w, h) in a grayscale image"""
+        return self.cascade.detectMultiScale(
+            gray, scaleFactor=self.scale_factor, minNeighbors=self.min_neighbors,
+            minSize=(min_size, min_size), maxSize=(max_size, max_size) if max_size else (0, 0),
+            flags=cv2.CASCADE_SCALE_IMAGE
+        )
+
+
+def suppress_overlaps(boxes, max_overlap=0.3):
+    """Drop boxes overlapping (IoU) a larger box that is kept"""
+    kept = []
+    for box in sorted(boxes, key=lambda b: b[2] * b[3], reverse=True):
+        x, y, w, h = box
+        overlapping = False
+        for kx, ky, kw, kh in kept:
+            ix = max(0, min(x + w, kx + kw) - max(x, kx))
+            iy = max(0, min(y + h, ky + kh) - max(y, ky))
+            inter = ix * iy
+            if inter / float(w * h + kw * kh - inter) > max_overlap:
+                overlapping = True
+                break
+        if not overlapping:
+            kept.append(box)
+    return np.array(kept, dtype=np.int32).reshape(-1, 4)
+
+
+class TwoStageDetector:
+    """Fast, permissive coarse pass confirmed by a stricter cascade per candidate
+
+    The coarse pass walks a sparse scale pyramid; the confirm pass only runs on
+    a padded crop around each candidate, restricted to sizes near it, so its
+    cost does not grow with the frame size.
+    """
+
+    def __init__(self, coarse, confirm, padding=0.25):
+        self.coarse = coarse
+        self.confirm = confirm
+        self.padding = padding
+
+    def params(self):
+        return {"coarse": self.coarse.params(), "confirm": self.confirm.params(), "padding": self.padding}
+
+    def detect(self, gray, min_size, max_size=None):
+        height, width = gray.shape[:2]
+        confirmed = []
+        for (x, y, w, h) in self.coarse.detect(gray, min_size, max_size):
+            pad = int(round(max(w, h) * self.padding))
+            x0, y0 = max(0, x - pad), max(0, y - pad)
+            x1, y1 = min(width, x + w + pad), min(height, y + h + pad)
+            region = gray[y0:y1, x0:x1]
+            found = self.confirm.detect(region, max(min_size, int(w * 0.7)), int(max(w, h) * 1.4))
+            confirmed.extend((fx + x0, fy + y0, fw, fh) for (fx, fy, fw, fh) in found)
+        return suppress_overlaps(confirmed)
+
+
+def detect_largest(detector, gray, min_size, band_ratio=2.0):
+    """The largest face only, searching size bands from the largest down
+
+    OpenCV ignores CASCADE_FIND_BIGGEST_OBJECT / CASCADE_DO_ROUGH_SEARCH for
+    current cascade files, so the early exit is done here: each band is one
+    detect() call restricted by minSize/maxSize, and the search stops at the
+    first band with a face. Large bands walk few, small pyramid levels, so a
+    face filling the frame is found for a fraction of a full search.
+
+    The band's box is then refined by one search of the whole frame from half
+    its size up: the cascade averages a face's box over the hits it groups,
+    and a band misses the smaller ones, which shifts the box by a few pixels
+    (enough for LBP histograms to differ) from the one a full search returns.
+    """
+    max_size = min(gray.shape[:2])
+    while max_size >= min_size:
+        band_min = max(min_size, int(max_size / band_ratio))
+        # Bands overlap slightly so a face on a band edge keeps its neighbours
+        faces = detector.detect(gray, band_min, int(max_size * 1.25))
+        if len(faces):
+            largest = max(faces, key=lambda f: f[2] * f[3])
+            refined = detector.detect(gray, max(min_size, int(largest[2] / 2)))
+            if len(refined):
+                largest = max(refined, key=lambda f: f[2] * f[3])
+            return np.array([largest], dtype=np.int32)
+        if band_min == min_size:
+            break
+        max_size = band_min
+    return np.zeros((0, 4), dtype=np.int32)
+
+
+def detect_downscaled(detector, gray, min_face_size, max_side=None, largest_only=False):
+    """Detect on a copy whose longer side is at most `max_side`; boxes are in `gray`'s coordinates
+
+    The minimum face size is scaled with the copy, but faces smaller than the
+    cascade window (24 px) in the copy are not found. With `largest_only` only
+    the largest face is returned, via `detect_largest`.
+    """
+    height, width = gray.shape[:2]
+    scale = 1.0
+    if max_side and max(height, width) > max_side:
+        scale = max_side / max(height, width)
+        gray = cv2.resize(gray, (round(width * scale), round(height * scale)), interpolation=cv2.INTER_AREA)
+
+    min_size = max(24, round(min_face_size * scale))
+    faces = detect_largest(detector, gray, min_size) if largest_only else detector.detect(gray, min_size)
+    if scale == 1.0 or len(faces) == 0:
+        return faces
+
+    faces = np.round(np.asarray(faces, dtype=np.float64) / scale).astype(np.int32)
+    # Rounding can push a box a pixel past the frame edge
+    faces[:, 2] = np.minimum(faces[:, 2], width - faces[:, 0])
+    faces[:, 3] = np.minimum(faces[:, 3], height - faces[:, 1])
+    return faces
+
+
+def detect_primary(detector, gray, min_face_size, max_side=None, min_face_fraction=0.0):
+    """The largest face of a frame only (at most one box), see `detect_downscaled`
+
+    The minimum face size grows to `min_face_fraction` of the frame's shorter
+    side. Recognition's primary-face path and enrollment both crop with this,
+    so a gallery photo submitted for recognition yields the same crop.
+    """
+    min_face_size = max(min_face_size, round(min_face_fraction * min(gray.shape[:2])))
+    return detect_downscaled(detector, gray, min_face_size, max_side, largest_only=True)
+
+
+# Detector backends by name; FaceRecognitionModel(detector=...) and the
+# ?detector= query parameter of /recognize pick one of these
+DETECTORS = {
+    "haar_default": lambda: HaarDetector("haarcascade_frontalface_default.xml"),
+    "haar_alt": lambda: HaarDetector("haarcascade_frontalface_alt.xml"),
+    "haar_alt2": lambda: HaarDetector("haarcascade_frontalface_alt2.xml"),
+    "haar_alt_tree": lambda: HaarDetector("haarcascade_frontalface_alt_tree.xml", min_neighbors=3),
+    "two_stage": lambda: TwoStageDetector(
+        coarse=HaarDetector("haarcascade_frontalface_alt2.xml", scale_factor=1.3, min_neighbors=2),
+        confirm=HaarDetector("haarcascade_frontalface_default.xml", scale_factor=1.1, min_neighbors=3)
+    ),
+}
+
+
+def create_detector(name):
+    """Instantiate a detector backend by name"""
+    if name not in DETECTORS:
+        raise ValueError(f"Unknown detector '{name}', expected one of {sorted(DETECTORS)}")
+    return DETECTORS[name]()
@@ -2,11 +2,62 @@ import cv2
 import os
 import numpy as np
 import json
+import logging
+import re
+import tempfile
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+from ann_index import IVFIndex
+from face_detectors import DEFAULT_DETECTOR, create_detector, detect_downscaled, detect_primary
+from frame_cache import FrameResultCache
+from frame_quality import check_frame, image_quality, measure_frame
+from image_io import decode_for_recognition, scale_boxes
+from enrollment import DetectionCache, run_enrollment, scan_gallery, validate_face_quality
+from file_lock import exclusive_lock
+from lbph_matcher import LBPHMatcher, compute_histograms
+from model_snapshot import compute_gallery_fingerprint, load_snapshot, save_snapshot
+from runtime_config import cpu_share
+
+logger = logging.getLogger(__name__)
+
+# Everything /recognize needs to turn a prediction into a name. Readers take one
+# reference to the current state; writers build a new one and swap it in, so a
+# request never sees a matcher paired with the wrong class names.
+GalleryState = namedtuple("GalleryState", ["matcher", "class_names", "index"], defaults=[None])
+
+VALID_MEMBER_NAME = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_-]*$")
+
+# team_data fields a /verify claim may name a member by; each value must
+# belong to a single member
+CLAIM_FIELDS = ("employee_id", "unique_id_number")
+
+# Held (in snapshot_dir) by the process training a gallery, see load_and_encode_images
+TRAIN_LOCK_FILE = "train.lock"
+
+# Held (in models_path) while a process rewrites team_data.json
+TEAM_DATA_LOCK_FILE = ".team_data.lock"
+
+
+class AmbiguousClaimError(LookupError):
+    """A claimed identifier belongs to more than one member"""
+
+
+def to_gray(image):
+    """Grayscale view of a BGR or already grayscale frame"""
+    return image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+
 class FaceRecognitionModel:
-    def __init__(self, models_path="Models"):
+    def __init__(self, models_path="Models", snapshot_dir=None, use_snapshot=True, enrollment_workers=None,
+                 watch_interval=None, detector=DEFAULT_DETECTOR):
         self.models_path = Path(models_path)
+        self.snapshot_dir = Path(snapshot_dir) if snapshot_dir else self.models_path / ".snapshots"
+        self.use_snapshot = use_snapshot
+        self.enrollment_workers = enrollment_workers  # None = one per available core
         
         # LENIENT THRESHOLDS - Allow team members through
         self.confidence_threshold = 120.0   # Much higher (was 80.0)
@@ -14,21 +65,68 @@ class FaceRecognitionModel:
         self.max_distance_threshold = 120.0 # Much higher (was 85.0)
         self.min_match_confidence = 0.30    # Much lower - 30% (was 0.60)
         
+        # LBPH parameters (OpenCV defaults) and normalized training face size
+        self.lbph_radius = 1
+        self.lbph_neighbors = 8
+        self.lbph_grid_x = 8
+        self.lbph_grid_y = 8
+        self.face_size = (200, 200)
+        
+        # Distance used by the vectorized matcher; chi_square_alt reproduces
+        # LBPHFaceRecognizer.predict(), so the thresholds above keep their meaning
+        self.matcher_metric = "chi_square_alt"
+        
+        # Recognition frames are detected on a copy whose longer side is at most
+        # this many pixels (None = full resolution); faces are still cropped
+        # from the full-resolution frame
+        self.detection_max_side = 640
+        
+        # Primary-face mode (one person in front of a kiosk camera): only the
+        # largest face is detected and recognized, and it must span at least
+        # this fraction of the frame's shorter side
+        self.primary_min_face_fraction = 0.1
+        
+        # Reject black, overexposed, flat or blurred frames before detection
+        # (limits in frame_quality); their metrics are reported either way
+        self.prefilter_frames = True
+        
+        # Approximate search (IVF index) for large galleries; below this many
+        # samples exact search is fast enough. n_probe/shortlist trade recall
+        # for latency, see ann_index.IVFIndex.
+        self.ann_min_gallery = 20000
+        self.ann_n_probe = 8
+        self.ann_shortlist = 128
+        
         print("Initializing Face Recognition Model...")
         print(f"LENIENT SECURITY MODE:")
         print(f"  Confidence threshold: {self.confidence_threshold}")
         print(f"  Max distance: {self.max_distance_threshold}") 
         print(f"  Min confidence required: {self.min_match_confidence}")
         
-        # Face detection and recognition
-        self.face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-        self.recognizer = cv2.face.LBPHFaceRecognizer_create()
+        # Face detection backend (see face_detectors.DETECTORS), used for
+        # training and recognition; requests may pick another one by name
+        self.detector_name = detector
+        self._thread_state = threading.local()
+        self.get_detector()
+        # Recognition results of recent frames, reused for near-identical
+        # resubmissions until the model changes (None disables it)
+        self.result_cache = FrameResultCache()
+        self.generation = 0
+        self._gallery = GalleryState(None, [])
+        self._gallery_lock = threading.RLock()
+        self._index_building = False
+        self._watcher = None
+        self._watch_stop = threading.Event()
+        self.watch_interval = watch_interval
+        self._executor = None
         
         # Training data
-        self.class_names = []
         self.team_data = {}
         self.model_trained = False
         self.training_features = []
+        self.training_labels = []
+        self.image_metadata = []
+        self.gallery_fingerprint = None
         
         print(f"Models path: {self.models_path}")
         
@@ -99,6 +197,99 @@ class FaceRecognitionModel:
         # Load and train
         self.load_team_data()
         self.load_and_encode_images()
+        
+        if watch_interval:
+            self.start_watching(watch_interval)
+
+    @property
+    def _gallery(self):
+        return self._gallery_state
+
+    @_gallery.setter
+    def _gallery(self, gallery):
+        self._gallery_state = gallery
+        self._model_changed()
+
+    def _model_changed(self):
+        """Invalidate cached recognition results after a gallery or team data swap"""
+        self.generation += 1
+        if self.result_cache is not None:
+            self.result_cache.clear()
+
+    @property
+    def class_names(self):
+        return self._gallery.class_names
+
+    @property
+    def team_data(self):
+        return self._team_data
+
+    @team_data.setter
+    def team_data(self, team_data):
+        # Claim lookups for /verify are rebuilt with every new team_data dict;
+        # an identifier shared by several members maps to all of them
+        claims = {}
+        for name, data in team_data.items():
+            if not isinstance(data, dict):
+                continue
+            for field in CLAIM_FIELDS:
+                if data.get(field):
+                    claims.setdefault((field, str(data[field])), []).append(name)
+        for (field, value), names in claims.items():
+            if len(names) > 1:
+                logger.warning("Duplicate claim identifier", extra={"field": field, "value": value,
+                                                                    "members": names})
+        self._team_data, self._claims = team_data, claims
+        self._model_changed()
+
+    def create_recognizer(self):
+        """Create an untrained LBPH recognizer with the configured parameters"""
+        return cv2.face.LBPHFaceRecognizer_create(
+            radius=self.lbph_radius, neighbors=self.lbph_neighbors,
+            grid_x=self.lbph_grid_x, grid_y=self.lbph_grid_y
+        )
+
+    def training_params(self):
+        """Parameters that influence the trained model, used to key snapshots"""
+        return {
+            "lbph_radius": self.lbph_radius,
+            "lbph_neighbors": self.lbph_neighbors,
+            "lbph_grid_x": self.lbph_grid_x,
+            "lbph_grid_y": self.lbph_grid_y,
+            "lbph_threshold": float(self.create_recognizer().getThreshold()),
+            "face_size": list(self.face_size),
+            "min_face_size": self.min_face_size,
+            "detector": self.detector_name,
+            "detector_params": self.get_detector().params(),
+            "detection_max_side": self.detection_max_side,
+            "primary_min_face_fraction": self.primary_min_face_fraction,
+            "matcher_metric": self.matcher_metric,
+        }
+
+    def load_snapshot(self, fingerprint):
+        """Restore the trained gallery from a matching snapshot
+
+        The gallery and face crops stay memory-mapped, so gunicorn workers
+        serving the same snapshot share a single copy through the page cache.
+        """
+        start = time.perf_counter()
+        meta = load_snapshot(self.snapshot_dir, fingerprint, metric=self.matcher_metric)
+        if meta is None:
+            return False
+        
+        with self._gallery_lock:
+            self.image_metadata = meta["images"]
+            # Views into the memory-mapped crops, not copies
+            self.training_features = list(meta["faces"])
+            self.training_labels = [image["label"] for image in self.image_metadata]
+            self.gallery_fingerprint = fingerprint
+            self._gallery = GalleryState(meta["matcher"], meta["class_names"])
+            self._schedule_index_build()
+            self.model_trained = len(self.class_names) > 0
+        
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        print(f"✓ Loaded model snapshot {fingerprint[:16]} in {elapsed_ms:.1f} ms ({len(self.class_names)} members)")
+        return self.model_trained
 
     def load_team_data(self):
         """Load team member data"""
@@ -115,187 +306,773 @@ class FaceRecognitionModel:
 
     def validate_face_quality(self, face_roi):
         """Validate face image quality"""
+        return validate_face_quality(face_roi, self.min_face_size)
+
+    def load_and_encode_images(self, workers=None):
+        """Load and train model (`workers` overrides enrollment_workers)"""
         try:
-            height, width = face_roi.shape
-            if height < self.min_face_size or width < self.min_face_size:
-                return False, "Face too small"
+            entries = scan_gallery(self.models_path)
+            print(f"Found {len(entries)} image files")
             
-            brightness = np.mean(face_roi)
-            if brightness < 30 or brightness > 220:
-                return False, "Poor lighting"
-            
-            laplacian_var = cv2.Laplacian(face_roi, cv2.CV_64F).var()
-            if laplacian_var < 50:
-                return False, "Image too blurry"
-            
-            contrast = face_roi.std()
-            if contrast < 15:
-                return False, "Low contrast"
+            params = self.training_params()
+            fingerprint = compute_gallery_fingerprint(entries, params)
+            if not self.use_snapshot:
+                self._train_gallery(entries, params, fingerprint, workers)
+                return
+            if self.load_snapshot(fingerprint):
+                return
             
-            return True, "Good quality"
+            # Every gunicorn worker's watcher sees a gallery change within one
+            # poll: the first to get the lock trains and saves the snapshot,
+            # the others wait for it and then only map that snapshot
+            with exclusive_lock(self.snapshot_dir / TRAIN_LOCK_FILE):
+                if self.load_snapshot(fingerprint):
+                    return
+                self._train_gallery(entries, params, fingerprint, workers)
             
         except Exception as e:
-            return False, f"Quality check failed: {str(e)}"
+            print(f"ERROR: Training failed: {str(e)}")
+            import traceback
+            traceback.print_exc()
+            # A failed reload keeps serving the previous gallery
+            self.model_trained = self._gallery.matcher is not None
 
-    def load_and_encode_images(self):
-        """Load and train model"""
-        try:
-            faces = []
-            labels = []
-            self.class_names = []
-            self.training_features = []
-            
-            image_files = list(self.models_path.glob("*.jpg")) + \
-                         list(self.models_path.glob("*.jpeg")) + \
-                         list(self.models_path.glob("*.png"))
-            
-            print(f"Found {len(image_files)} image files")
+    def _train_gallery(self, entries, params, fingerprint, workers=None):
+        """Detect, crop and train on the scanned gallery, then swap it in (and save its snapshot)"""
+        # Detections of unchanged photos are reused from the previous run
+        cache = DetectionCache(self.snapshot_dir / "detections.json", params) if self.use_snapshot else None
+        report = run_enrollment(entries, params, workers=workers or self.enrollment_workers, cache=cache)
+        
+        faces = []
+        labels = []
+        class_names = []
+        label_by_name = {}
+        image_metadata = []
+        
+        for result in report.accepted:
+            entry = result["entry"]
+            # Several images of one member ("Name__2.jpg") share a label
+            label = label_by_name.setdefault(entry.name, len(class_names))
+            if label == len(class_names):
+                class_names.append(entry.name)
             
-            for idx, image_path in enumerate(image_files):
-                name = image_path.stem
-                print(f"Processing: {name}")
-                
-                image = cv2.imread(str(image_path))
-                if image is None:
-                    print(f"✗ Could not load: {name}")
-                    continue
-                
-                gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-                
-                detected_faces = self.face_cascade.detectMultiScale(
-                    gray, scaleFactor=1.1, minNeighbors=5,
-                    minSize=(self.min_face_size, self.min_face_size),
-                    flags=cv2.CASCADE_SCALE_IMAGE
-                )
+            faces.append(result["face"])
+            labels.append(label)
+            image_metadata.append({
+                "file": entry.file_name,
+                "name": entry.name,
+                "label": label,
+                "bounding_box": result["bounding_box"],
+                "quality_ok": bool(result["quality_ok"]),
+                "quality_msg": result["quality_msg"]
+            })
+        
+        if len(faces) < 1:
+            report.print_summary()
+            print("ERROR: Need at least 1 valid face image to train")
+            with self._gallery_lock:
+                self.training_features, self.training_labels, self.image_metadata = [], [], []
+                self.gallery_fingerprint = fingerprint
+                self._gallery = GalleryState(None, [])
+                self.model_trained = False
+            return
+        
+        # Single histogram pass over every accepted crop
+        start = time.perf_counter()
+        matcher = LBPHMatcher(self.compute_histograms(faces), labels, metric=self.matcher_metric)
+        report.wall_times["train"] = time.perf_counter() - start
+        report.print_summary()
+        
+        saved = None
+        if self.use_snapshot:
+            saved = save_snapshot(self.snapshot_dir, fingerprint, matcher, class_names,
+                                  faces, image_metadata, params)
+            if saved:
+                print(f"✓ Saved model snapshot: {saved.name}")
+        
+        # Serve from the memory-mapped snapshot so this process does not keep
+        # a private copy of the gallery; fall back to the in-memory one
+        if not (saved and self.load_snapshot(fingerprint)):
+            with self._gallery_lock:
+                self.training_features = faces
+                self.training_labels = labels
+                self.image_metadata = image_metadata
+                self.gallery_fingerprint = fingerprint
+                self._gallery = GalleryState(matcher, class_names)
+                self._schedule_index_build()
+                self.model_trained = True
+        
+        print(f"✓ Model trained successfully for {len(self.class_names)} members: {self.class_names}")
+        print("Model initialization complete. Known members:", len(self.class_names))
+
+    def start_watching(self, interval=5.0):
+        """Poll Models/ and team_data.json, reloading in the background on change
+
+        A reload builds a complete new gallery state on the watcher thread and
+        swaps it in with a single assignment: requests already running finish
+        on the state they picked up, and readers never take a lock.
+        """
+        if self._watcher is not None and self._watcher.is_alive():
+            return
+        self._watch_stop.clear()
+        self._watcher = threading.Thread(target=self._watch_loop, args=(interval,),
+                                         name="models-watcher", daemon=True)
+        self._watcher.start()
+        print(f"Watching {self.models_path} for changes every {interval}s")
+
+    def stop_watching(self):
+        self._watch_stop.set()
+        if self._watcher is not None:
+            self._watcher.join()
+            self._watcher = None
+
+    def prepare_for_fork(self):
+        """Quiesce background threads before a preforking server forks workers
+
+        Threads do not survive fork(); stopping them first also guarantees no
+        lock is held mid-update when the gallery is copied into the children.
+        """
+        self.stop_watching()
+        for thread in threading.enumerate():
+            if thread.name == "ann-index-build":
+                thread.join()
+
+    def after_fork(self):
+        """Recreate per-process state in a freshly forked worker
+
+        The gallery arrays are inherited copy-on-write (or shared through the
+        page cache when memory-mapped) and are never written here; only the
+        OpenCV objects, locks and background threads are rebuilt.
+        """
+        self._thread_state = threading.local()
+        self.get_detector()
+        self._executor = None  # Pool threads did not survive the fork
+        if self.result_cache is not None:
+            self.result_cache = FrameResultCache(self.result_cache.max_entries, self.result_cache.ttl,
+                                                 self.result_cache.max_distance, self.result_cache.max_difference)
+        self._gallery_lock = threading.RLock()
+        self._watch_stop = threading.Event()
+        self._watcher = None
+        self._index_building = False
+        with self._gallery_lock:
+            self._schedule_index_build()
+        if self.watch_interval:
+            self.start_watching(self.watch_interval)
+
+    def _team_data_mtime(self):
+        try:
+            return (self.models_path / "team_data.json").stat().st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def current_fingerprint(self):
+        """Fingerprint of the Models directory as it is on disk right now"""
+        return compute_gallery_fingerprint(scan_gallery(self.models_path), self.training_params())
+
+    def _watch_loop(self, interval):
+        team_data_mtime = self._team_data_mtime()
+        failed_fingerprint = None
+        while not self._watch_stop.wait(interval):
+            try:
+                mtime = self._team_data_mtime()
+                if mtime != team_data_mtime:
+                    team_data_mtime = mtime
+                    self.load_team_data()
                 
-                if len(detected_faces) == 0:
-                    print(f"✗ No face detected in: {name}")
+                # A directory scan per poll; training only runs when the
+                # gallery really changed (and snapshots make it cheap when
+                # another process already trained the same content)
+                fingerprint = self.current_fingerprint()
+                if fingerprint == self.gallery_fingerprint or fingerprint == failed_fingerprint:
                     continue
-                
-                if len(detected_faces) > 1:
-                    print(f"⚠ Multiple faces detected in: {name}, using largest")
-                    detected_faces = [max(detected_faces, key=lambda f: f[2] * f[3])]
-                
-                (x, y, w, h) = detected_faces[0]
-                face_roi = gray[y:y+h, x:x+w]
-                
-                print(f"Face size: {face_roi.shape}")
-                
-                is_good_quality, quality_msg = self.validate_face_quality(face_roi)
-                print(f"Quality check: {is_good_quality} - {quality_msg}")
-                
-                # Accept for training regardless of quality for now
-                face_roi = cv2.resize(face_roi, (200, 200))
-                
-                faces.append(face_roi)
-                labels.append(idx)
-                self.class_names.append(name)
-                self.training_features.append(face_roi.copy())
-                
-                print(f"✓ Added to training set: {name}")
+                print(f"Gallery changed on disk, reloading model ({fingerprint[:16]})...")
+                # Serially: forking the enrollment pool from a serving process
+                # would copy locks its request, log and executor threads may hold
+                self.load_and_encode_images(workers=1)
+                if self.gallery_fingerprint != fingerprint:
+                    failed_fingerprint = fingerprint  # Do not retry until the files change again
+            except Exception as e:
+                print(f"⚠ Model watcher error: {str(e)}")
+
+    def _thread_objects(self):
+        """OpenCV objects owned by the calling thread
+
+        Cascades and recognizers keep scratch buffers and are not safe to share
+        between request threads, so every thread (Flask's threaded server,
+        the batch pool) builds its own on first use. They are cheap compared
+        with the gallery, which stays a single immutable copy for all threads.
+        """
+        state = self._thread_state
+        if not hasattr(state, "detectors"):
+            state.detectors = {}
+            state.extractor = self.create_recognizer()
+        return state
+
+    def get_detector(self, name=None):
+        """The calling thread's detector backend by name (default: the deployment's)"""
+        name = name or self.detector_name
+        detectors = self._thread_objects().detectors
+        detector = detectors.get(name)
+        if detector is None:
+            detector = detectors[name] = create_detector(name)
+        return detector
+
+    def detect_faces(self, gray, max_side=-1, detector=None, primary_only=False, scale=1.0):
+        """Run the face detector on a grayscale image; boxes are in its coordinates
+
+        Large images are detected on a copy downscaled to `max_side` (default
+        `detection_max_side`), which cuts the cascade's cost on big photos, and
+        the boxes are mapped back to full resolution. `primary_only` returns
+        just the largest face, with a minimum size adapted to the frame, the
+        way enrollment crops gallery photos. `scale` maps `gray` to the
+        uploaded image (see image_io.decode_for_recognition); `min_face_size`
+        is in the uploaded image's pixels.
+        """
+        if max_side == -1:
+            max_side = self.detection_max_side
+        min_face_size = self.min_face_size / scale
+        if primary_only:
+            return detect_primary(self.get_detector(detector), gray, min_face_size, max_side,
+                                  self.primary_min_face_fraction)
+        return detect_downscaled(self.get_detector(detector), gray, min_face_size, max_side)
+
+    def compute_histograms(self, face_rois):
+        """LBPH histograms of normalized face crops"""
+        return compute_histograms(face_rois, recognizer=self._thread_objects().extractor)
+
+    def match_faces(self, gallery, face_rois, k=1):
+        """Sorted (label, distance) lists of the `k` nearest identities per face crop"""
+        if gallery.matcher is None or not face_rois:
+            return [[] for _ in face_rois]
+        searcher = gallery.index or gallery.matcher
+        return searcher.search(self.compute_histograms(face_rois), k)
+
+    def _schedule_index_build(self):
+        """Build the ANN index in the background once the gallery is large enough
+
+        Until it is ready (and for small galleries) recognition uses exact search.
+        Callers hold the gallery lock.
+        """
+        gallery = self._gallery
+        if (gallery.matcher is None or gallery.index is not None or self._index_building
+                or gallery.matcher.size < self.ann_min_gallery):
+            return
+        self._index_building = True
+        threading.Thread(target=self._build_index, args=(gallery.matcher,),
+                         name="ann-index-build", daemon=True).start()
+
+    def _build_index(self, matcher):
+        start = time.perf_counter()
+        try:
+            index = IVFIndex(matcher, n_probe=self.ann_n_probe, shortlist=self.ann_shortlist)
+        except Exception as e:
+            index = None
+            print(f"⚠ ANN index build failed, using exact search: {str(e)}")
+        
+        with self._gallery_lock:
+            self._index_building = False
+            gallery = self._gallery
+            if gallery.matcher is not matcher:
+                # Gallery was rebuilt meanwhile; its schedule call found this
+                # build running, so the new gallery is indexed from here
+                self._schedule_index_build()
+                return
+            if index is None:
+                return
+            if matcher.size > index.size:
+                # Catch up with members enrolled while the index was being built
+                index.add(matcher.histograms[index.size:], np.arange(index.size, matcher.size))
+            self._gallery = gallery._replace(index=index)
+        
+        print(f"✓ Built ANN index over {index.size} samples in {time.perf_counter() - start:.1f}s")
+
+    def distance_to_confidence(self, distance):
+        """Map an LBPH distance to a 0-1 confidence score"""
+        return max(0, (self.confidence_threshold - distance) / self.confidence_threshold)
+
+    def search(self, face, k=5):
+        """The `k` nearest gallery identities for a face crop (grayscale or BGR)"""
+        if face.ndim == 3:
+            face = cv2.cvtColor(face, cv2.COLOR_BGR2GRAY)
+        if face.shape[:2] != self.face_size[::-1]:
+            face = cv2.resize(face, self.face_size)
+        
+        gallery = self._gallery
+        return self._describe_candidates(gallery, self.match_faces(gallery, [face], k)[0])
+
+    def prefilter(self, image):
+        """(metrics, rejection reason or None) for a frame, see frame_quality"""
+        metrics = measure_frame(image)
+        ok, reason = check_frame(metrics)
+        return metrics, (None if ok or not self.prefilter_frames else reason)
+
+    def _add_image_quality(self, results, metrics, frame_shape, faces, face_rois):
+        for result, box, roi in zip(results, faces, face_rois):
+            result["image_quality"] = image_quality(metrics, frame_shape, box, roi)
+        return results
+
+    def crop_faces(self, gray, faces):
+        """Normalized LBPH input crops for detected face boxes"""
+        return [cv2.resize(gray[y:y+h, x:x+w], self.face_size) for (x, y, w, h) in faces]
+
+    def _describe_candidates(self, gallery, candidates):
+        return [{
+            "name": gallery.class_names[label],
+            "label": label,
+            "distance": distance,
+            "confidence": self.distance_to_confidence(distance)
+        } for label, distance in candidates]
+
+    def enroll_from_image(self, name, image_bytes, team_data=None, add_sample=False):
+        """Detect the largest face in an encoded photo (JPEG, PNG) and enroll it under `name`
+
+        The photo is decoded and cropped exactly like training and recognition
+        do, and saved to the Models directory as uploaded, so a retrain after
+        a restart reproduces the same crop. A `name` that is already known is
+        refused (`conflict`) unless `add_sample` asks for another photo of that
+        member, which leaves their team data as it is.
+        """
+        if not VALID_MEMBER_NAME.match(name or "") or "__" in name:
+            return {"success": False, "error": "Name must contain only letters, digits, '-' and '_'"}
+        
+        decoded = decode_for_recognition(image_bytes, self.detection_max_side)
+        if decoded is None:
+            return {"success": False, "error": "Could not decode image"}
+        gray, scale = decoded
+        faces = self.detect_faces(gray, primary_only=True, scale=scale)
+        if len(faces) == 0:
+            return {"success": False, "error": "No face detected in image"}
+        
+        (x, y, w, h) = faces[0]
+        face_roi = gray[y:y+h, x:x+w]
+        is_good_quality, quality_msg = validate_face_quality(face_roi, self.min_face_size / scale)
+        face_roi = cv2.resize(face_roi, self.face_size)
+        
+        # Checked and enrolled under one lock hold, so two requests cannot both
+        # create the same member
+        with self._gallery_lock:
+            conflict = self._enrollment_conflict(name, team_data, add_sample)
+            if conflict:
+                return {"success": False, "error": conflict, "conflict": True}
             
-            print(f"\nTraining Summary:")
-            print(f"Valid faces found: {len(faces)}")
-            print(f"Class names: {self.class_names}")
+            image_file = self._persist_enrollment_image(name, image_bytes)
+            result = self.enroll_face(name, face_roi, team_data, metadata={
+                "file": image_file,
+                "name": name,
+                "bounding_box": [int(x), int(y), int(w), int(h)],
+                "quality_ok": bool(is_good_quality),
+                "quality_msg": quality_msg
+            })
+            if image_file:
+                # The new photo is already in memory; keep the watcher from retraining for it
+                self.gallery_fingerprint = self.current_fingerprint()
+        result["quality"] = {"ok": bool(is_good_quality), "message": quality_msg}
+        result["bounding_box"] = {"x": int(x), "y": int(y), "width": int(w), "height": int(h)}
+        return scale_boxes(result, scale)
+
+    def _enrollment_conflict(self, name, team_data, add_sample):
+        """Why enrolling under `name` must be refused, None when it may go ahead"""
+        exists = name in self.class_names or name in self.team_data
+        if not exists:
+            for field in CLAIM_FIELDS:
+                value = (team_data or {}).get(field)
+                owners = [owner for owner in self._claims.get((field, str(value)), []) if owner != name]
+                if value and owners:
+                    return f"{field} {value} already belongs to {owners[0]}"
+            return None
+        if not add_sample:
+            return f"{name} is already enrolled; set add_sample to add another photo"
+        if team_data:
+            return f"add_sample does not change the team data of {name}"
+        return None
+
+    def enroll_face(self, name, face_roi, team_data=None, metadata=None):
+        """Add a normalized face crop to the gallery without retraining it
+
+        Only the new face's histogram is computed and appended to the matcher,
+        so the cost does not depend on the gallery size. Readers keep using the
+        state they picked up; the new sample becomes visible atomically.
+        """
+        start = time.perf_counter()
+        histogram = self.compute_histograms([face_roi])
+        
+        with self._gallery_lock:
+            gallery = self._gallery
+            class_names = gallery.class_names
+            if name in class_names:
+                label = class_names.index(name)
+            else:
+                # Append-only: readers holding the old state never see this label
+                label = len(class_names)
+                class_names.append(name)
             
-            if len(faces) < 1:
-                print("ERROR: Need at least 1 valid face image to train")
-                self.model_trained = False
-                return
+            self.training_features.append(face_roi)
+            self.training_labels.append(label)
+            self.image_metadata.append({**(metadata or {"name": name}), "label": label})
             
-            # Train recognizer
-            faces = np.array(faces)
-            labels = np.array(labels)
+            if team_data:
+                self._persist_team_data(name, team_data)
             
-            self.recognizer.train(faces, labels)
+            if gallery.matcher is None:
+                self._gallery = GalleryState(LBPHMatcher(histogram, [label], metric=self.matcher_metric), class_names)
+            else:
+                gallery.matcher.add(histogram, [label])
+                if gallery.index is not None:
+                    gallery.index.add(histogram, [gallery.matcher.size - 1])
+                # Added in place, so the gallery setter did not run
+                self._model_changed()
+                self._schedule_index_build()
             self.model_trained = True
+        
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        print(f"✓ Enrolled {name} (label {label}) in {elapsed_ms:.1f} ms")
+        return {"success": True, "name": name, "label": label, "enrollment_time_ms": round(elapsed_ms, 2),
+                "known_faces": len(class_names)}
+
+    def remove_member(self, name):
+        """Remove every sample of `name` by repacking the matcher without them"""
+        with self._gallery_lock:
+            gallery = self._gallery
+            if name not in gallery.class_names:
+                return False
+            
+            keep = [i for i, meta in enumerate(self.image_metadata) if meta.get("name") != name]
+            removed_files = [meta.get("file") for meta in self.image_metadata if meta.get("name") == name]
+            
+            class_names = []
+            label_by_name = {}
+            labels, image_metadata = [], []
+            for i in keep:
+                member = self.image_metadata[i]["name"]
+                label = label_by_name.setdefault(member, len(class_names))
+                if label == len(class_names):
+                    class_names.append(member)
+                labels.append(label)
+                image_metadata.append({**self.image_metadata[i], "label": label})
             
-            print(f"✓ Model trained successfully for {len(self.class_names)} members: {self.class_names}")
-            print("Model initialization complete. Known members:", len(self.class_names))
+            matcher = gallery.matcher.subset(keep, labels) if keep else None
             
+            self.training_features = [self.training_features[i] for i in keep]
+            self.training_labels = labels
+            self.image_metadata = image_metadata
+            self._gallery = GalleryState(matcher, class_names)
+            self._schedule_index_build()
+            self.model_trained = len(class_names) > 0
+            
+            for file_name in removed_files:
+                if file_name and (self.models_path / file_name).exists():
+                    (self.models_path / file_name).unlink()
+            self.team_data = {member: data for member, data in self.team_data.items() if member != name}
+            self._persist_team_data(name, None)
+            self.gallery_fingerprint = self.current_fingerprint()
+        
+        print(f"✓ Removed {name} from the gallery ({len(class_names)} members left)")
+        return True
+
+    def _persist_enrollment_image(self, name, image_bytes):
+        """Save the uploaded photo, unchanged, to the Models directory so it survives restarts"""
+        extension = ".png" if bytes(image_bytes[:8]) == b"\x89PNG\r\n\x1a\n" else ".jpg"
+        file_name = f"{name}{extension}"
+        suffix = 2
+        while (self.models_path / file_name).exists():
+            file_name = f"{name}__{suffix}{extension}"
+            suffix += 1
+        try:
+            with open(self.models_path / file_name, "wb") as f:
+                f.write(image_bytes)
+            return file_name
         except Exception as e:
-            print(f"ERROR: Training failed: {str(e)}")
-            import traceback
-            traceback.print_exc()
-            self.model_trained = False
+            print(f"⚠ Could not save enrollment image for {name}: {str(e)}")
+            return None
 
-    def recognize_face_from_image(self, image):
-        """STRICT face recognition - prevent false positives"""
+    def _persist_team_data(self, name, team_data):
+        """Update (or remove, when team_data is None) a member in team_data.json"""
+        if team_data is not None:
+            self.team_data = {**self.team_data, name: team_data}
+        
+        team_data_path = self.models_path / "team_data.json"
+        tmp_path = None
+        try:
+            # Other workers update the same file: read, modify and replace it
+            # under one lock hold so that no update is lost
+            with exclusive_lock(self.models_path / TEAM_DATA_LOCK_FILE):
+                stored = {}
+                if team_data_path.exists():
+                    with open(team_data_path, 'r') as f:
+                        stored = json.load(f)
+                if team_data is None:
+                    if name not in stored:
+                        return
+                    stored.pop(name)
+                else:
+                    stored[name] = team_data
+                
+                fd, tmp_path = tempfile.mkstemp(prefix=".team_data-", suffix=".tmp", dir=self.models_path)
+                with os.fdopen(fd, 'w') as f:
+                    json.dump(stored, f, indent=2)
+                os.replace(tmp_path, team_data_path)
+        except Exception as e:
+            print(f"⚠ Could not update team_data.json: {str(e)}")
+            if tmp_path is not None and os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+
+    def _judge_faces(self, gallery, faces, matches, top_k=None):
+        """Apply the security thresholds to the best match of each detected face"""
+        results = []
+        for (x, y, w, h), candidates in zip(faces, matches):
+            label, distance = candidates[0] if candidates else (-1, float("inf"))
+            
+            # Calculate confidence score (0-1)
+            confidence = self.distance_to_confidence(distance)
+            
+            # VERY STRICT MATCHING CONDITIONS
+            is_valid_match = (
+                self.passes_thresholds(distance, confidence) and
+                label < len(gallery.class_names) and           # Valid label
+                label >= 0                                     # Non-negative
+            )
+            
+            # One record per face, sampled (FACETRUST_LOG_SAMPLING); the check
+            # skips building it when DEBUG is off
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Security check", extra={
+                    "label": int(label),
+                    "distance": round(float(distance), 2),
+                    "confidence": round(confidence, 3),
+                    "confidence_threshold": self.confidence_threshold,
+                    "min_confidence": self.min_match_confidence,
+                    "authorized": bool(is_valid_match),
+                })
+            
+            if is_valid_match:
+                name = gallery.class_names[label]
+                team_data = self.team_data.get(name, {})
+                
+                results.append({
+                    "matched": True,
+                    "name": name,
+                    "confidence": confidence,
+                    "distance": distance,
+                    "team_data": team_data,
+                    "bounding_box": {"x": int(x), "y": int(y), "width": int(w), "height": int(h)},
+                    "reason": f"✅ VERIFIED: {name} ({confidence:.1%} confidence)"
+                })
+            else:
+                results.append({
+                    "matched": False,
+                    "name": "Unknown",
+                    "confidence": confidence,
+                    "distance": distance,
+                    "reason": f"❌ ACCESS DENIED - Insufficient security clearance (Score: {confidence:.1%}, Required: {self.min_match_confidence:.1%})",
+                    "team_data": {},
+                    "bounding_box": {"x": int(x), "y": int(y), "width": int(w), "height": int(h)}
+                })
+        
+            if top_k:
+                results[-1]["candidates"] = self._describe_candidates(gallery, candidates)
+                if len(candidates) > 1:
+                    results[-1]["margin"] = candidates[1][1] - candidates[0][1]
+        
+        return results
+
+    def _result_key(self, image, top_k, detector, primary_only, scale):
+        """Everything besides the frame's content that a cached recognition result depends on"""
+        # The frame's size and scale too: bounding boxes are in its coordinates,
+        # and the minimum face size depends on the scale
+        return (self.generation, image.shape[:2], scale, top_k, detector or self.detector_name, primary_only,
+                self.confidence_threshold, self.max_distance_threshold, self.min_match_confidence,
+                self.min_face_size, self.prefilter_frames, self.detection_max_side,
+                self.primary_min_face_fraction, self.ann_n_probe, self.ann_shortlist)
+
+    def recognize_face_from_image(self, image, top_k=None, detector=None, primary_only=False, scale=1.0):
+        """STRICT face recognition - prevent false positives
+
+        With `top_k`, each face result also lists the `top_k` nearest identities
+        ("candidates") and the distance margin between the best two. `detector`
+        overrides the deployment's detector backend for this image, and
+        `primary_only` recognizes only the largest face. Near-identical frames
+        submitted again are answered from `result_cache`. `image` may be BGR or
+        already grayscale, and `scale` is the factor a reduced decode was
+        shrunk by (see image_io.decode_for_recognition); boxes stay in
+        `image`'s coordinates.
+        """
+        def recognize():
+            return self._recognize(image, top_k, detector, primary_only, scale)
+        
+        if self.result_cache is None or not self.model_trained:
+            return recognize()
+        return self.result_cache.get_or_compute(image, self._result_key(image, top_k, detector, primary_only, scale),
+                                                recognize, store=lambda result: result.get("success"))
+
+    def _recognize(self, image, top_k, detector, primary_only, scale):
         try:
             if not self.model_trained:
                 return {"success": False, "error": "Model not trained", "faces_found": 0, "results": []}
             
-            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+            gallery = self._gallery
+            metrics, rejected = self.prefilter(image)
+            if rejected:
+                return {"success": True, "faces_found": 0, "results": [], "rejected": rejected,
+                        "image_quality": image_quality(metrics)}
             
-            faces = self.face_cascade.detectMultiScale(
-                gray, scaleFactor=1.1, minNeighbors=5,
-                minSize=(self.min_face_size, self.min_face_size),
-                flags=cv2.CASCADE_SCALE_IMAGE
-            )
+            gray = to_gray(image)
+            faces = self.detect_faces(gray, detector=detector, primary_only=primary_only, scale=scale)
             
             if len(faces) == 0:
-                return {"success": True, "faces_found": 0, "results": []}
+                return {"success": True, "faces_found": 0, "results": [], "image_quality": image_quality(metrics)}
             
-            results = []
+            face_rois = self.crop_faces(gray, faces)
             
-            for (x, y, w, h) in faces:
-                face_roi = gray[y:y+h, x:x+w]
-                face_roi = cv2.resize(face_roi, (200, 200))
-                
-                # Get prediction
-                label, distance = self.recognizer.predict(face_roi)
-                
-                # Calculate confidence score (0-1)
-                confidence = max(0, (self.confidence_threshold - distance) / self.confidence_threshold)
-                
-                print(f"STRICT SECURITY CHECK:")
-                print(f"  Label: {label}")
-                print(f"  Distance: {distance:.2f}")
-                print(f"  Confidence: {confidence:.3f} ({confidence*100:.1f}%)")
-                print(f"  Threshold: {self.confidence_threshold}")
-                print(f"  Required confidence: {self.min_match_confidence}")
-                
-                # VERY STRICT MATCHING CONDITIONS
-                is_valid_match = (
-                    distance <= self.confidence_threshold and      # Distance check
-                    distance <= self.max_distance_threshold and    # Max distance
-                    confidence >= self.min_match_confidence and    # Minimum confidence
-                    label < len(self.class_names) and              # Valid label
-                    label >= 0                                     # Non-negative
-                )
-                
-                print(f"  SECURITY DECISION: {'✅ AUTHORIZED' if is_valid_match else '❌ UNAUTHORIZED'}")
-                
-                if is_valid_match:
-                    name = self.class_names[label]
-                    team_data = self.team_data.get(name, {})
-                    
-                    results.append({
-                        "matched": True,
-                        "name": name,
-                        "confidence": confidence,
-                        "distance": distance,
-                        "team_data": team_data,
-                        "bounding_box": {"x": int(x), "y": int(y), "width": int(w), "height": int(h)},
-                        "reason": f"✅ VERIFIED: {name} ({confidence:.1%} confidence)"
-                    })
-                else:
-                    results.append({
-                        "matched": False,
-                        "name": "Unknown",
-                        "confidence": confidence,
-                        "distance": distance,
-                        "reason": f"❌ ACCESS DENIED - Insufficient security clearance (Score: {confidence:.1%}, Required: {self.min_match_confidence:.1%})",
-                        "team_data": {},
-                        "bounding_box": {"x": int(x), "y": int(y), "width": int(w), "height": int(h)}
-                    })
-            
-            return {"success": True, "faces_found": len(faces), "results": results}
+            # One batched, vectorized gallery scan for every detected face
+            matches = self.match_faces(gallery, face_rois, k=max(1, top_k or 1))
+            results = self._judge_faces(gallery, faces, matches, top_k)
+            return {"success": True, "faces_found": len(faces), "image_quality": image_quality(metrics),
+                    "results": self._add_image_quality(results, metrics, gray.shape, faces, face_rois)}
             
         except Exception as e:
-            print(f"Recognition error: {str(e)}")
+            logger.error("Recognition error: %s", e)
             return {"success": False, "error": str(e), "faces_found": 0, "results": []}
 
+    @property
+    def executor(self):
+        """Thread pool for per-image work, one thread per CPU of this worker's share
+
+        OpenCV releases the GIL while it runs.
+        """
+        if self._executor is None:
+            with self._gallery_lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=cpu_share(),
+                                                        thread_name_prefix="recognize")
+        return self._executor
+
+    def recognize_batch(self, images, top_k=None, detector=None, primary_only=False, decode=None):
+        """Recognize many images with parallel detection and one gallery scan
+
+        `images` are BGR images, or raw payloads that `decode` turns into
+        (frame, scale) pairs like image_io.decode_for_recognition on the pool
+        threads. Returns one `recognize_face_from_image`-style result per
+        image, in input order, with boxes in the original images' coordinates.
+        """
+        if not self.model_trained:
+            return [{"success": False, "error": "Model not trained", "faces_found": 0, "results": []}
+                    for _ in images]
+        
+        def locate(item):
+            # (faces, face crops, frame metrics, frame shape, scale, rejection reason or error)
+            try:
+                decoded = decode(item) if decode else (item, 1.0)
+                if decoded is None or decoded[0] is None:
+                    return None, None, None, None, 1.0, "Could not decode image"
+                image, scale = decoded
+                metrics, rejected = self.prefilter(image)
+                if rejected:
+                    return [], [], metrics, image.shape, scale, rejected
+                gray = to_gray(image)
+                faces = self.detect_faces(gray, detector=detector, primary_only=primary_only, scale=scale)
+                return faces, self.crop_faces(gray, faces), metrics, gray.shape, scale, None
+            except Exception as e:
+                return None, None, None, None, 1.0, str(e)
+        
+        located = list(self.executor.map(locate, images))
+        
+        # Every face of every image goes through a single vectorized scan
+        gallery = self._gallery
+        face_rois = [roi for _, rois, _, _, _, _ in located if rois for roi in rois]
+        matches = iter(self.match_faces(gallery, face_rois, k=max(1, top_k or 1)))
+        
+        results = []
+        for faces, rois, metrics, shape, scale, problem in located:
+            if metrics is None:
+                results.append({"success": False, "error": problem, "faces_found": 0, "results": []})
+                continue
+            result = {"success": True, "faces_found": len(faces), "image_quality": image_quality(metrics)}
+            if problem:
+                result.update(results=[], rejected=problem)
+            else:
+                image_matches = [next(matches) for _ in rois]
+                judged = self._judge_faces(gallery, faces, image_matches, top_k)
+                result["results"] = self._add_image_quality(judged, metrics, shape, faces, rois)
+            results.append(scale_boxes(result, scale))
+        return results
+
+    def passes_thresholds(self, distance, confidence):
+        """Whether a distance/confidence pair clears every security threshold"""
+        return (
+            distance <= self.confidence_threshold and      # Distance check
+            distance <= self.max_distance_threshold and    # Max distance
+            confidence >= self.min_match_confidence        # Minimum confidence
+        )
+
+    def resolve_claim(self, employee_id=None, unique_id_number=None, name=None):
+        """Gallery member name for a claimed identity, or None if it is unknown
+
+        Raises AmbiguousClaimError when the identifier belongs to several
+        members, rather than picking one of them.
+        """
+        if name:
+            return name if name in self.class_names else None
+        for field, value in (("employee_id", employee_id), ("unique_id_number", unique_id_number)):
+            if value:
+                names = self._claims.get((field, str(value)), [])
+                if len(names) > 1:
+                    raise AmbiguousClaimError(f"{field} {value} belongs to several members")
+                return names[0] if names else None
+        return None
+
+    def verify_face_from_image(self, image, claimed_name, scale=1.0):
+        """1:1 verification of the largest face against one member's samples only
+
+        The cost depends on the claimed member's number of photos, not on the
+        gallery size. Decisions use the same thresholds as recognition.
+        `scale` is that of recognize_face_from_image.
+        """
+        try:
+            gallery = self._gallery
+            if gallery.matcher is None or claimed_name not in gallery.class_names:
+                return {"success": False, "error": f"Unknown identity: {claimed_name}"}
+            
+            metrics, rejected = self.prefilter(image)
+            if rejected:
+                return {"success": True, "face_found": False, "verified": False, "name": claimed_name,
+                        "reason": rejected, "rejected": rejected, "image_quality": image_quality(metrics)}
+            
+            gray = to_gray(image)
+            faces = self.detect_faces(gray, primary_only=True, scale=scale)
+            if len(faces) == 0:
+                return {"success": True, "face_found": False, "verified": False, "name": claimed_name,
+                        "reason": "No face detected", "image_quality": image_quality(metrics)}
+            
+            (x, y, w, h) = faces[0]
+            face_roi = cv2.resize(gray[y:y+h, x:x+w], self.face_size)
+            histogram = self.compute_histograms([face_roi])
+            columns = gallery.matcher.columns_of(gallery.class_names.index(claimed_name))
+            distance = float(gallery.matcher.distances(histogram, columns=columns)[0].min())
+            confidence = self.distance_to_confidence(distance)
+            verified = self.passes_thresholds(distance, confidence)
+            
+            logger.info("1:1 verification", extra={"claimed_name": claimed_name, "distance": round(distance, 2),
+                                                   "confidence": round(confidence, 3), "verified": verified})
+            
+            return {
+                "success": True,
+                "face_found": True,
+                "verified": verified,
+                "name": claimed_name,
+                "distance": distance,
+                "confidence": confidence,
+                "samples_compared": len(columns),
+                "bounding_box": {"x": int(x), "y": int(y), "width": int(w), "height": int(h)},
+                "image_quality": image_quality(metrics, gray.shape, faces[0], face_roi),
+                "reason": (f"✅ VERIFIED: {claimed_name} ({confidence:.1%} confidence)" if verified else
+                           f"❌ Face does not match {claimed_name} (Score: {confidence:.1%}, "
+                           f"Required: {self.min_match_confidence:.1%})")
+            }
+            
+        except Exception as e:
+            logger.error("Verification error: %s", e)
+            return {"success": False, "error": str(e)}
+
     def update_thresholds(self, confidence_threshold=None, max_distance=None, min_face_size=None):
         """Update recognition thresholds for fine-tuning accuracy"""
         if confidence_threshold is not None:
@@ -305,5 +1082,7 @@ class FaceRecognitionModel:
         if min_face_size is not None:
             self.min_face_size = min_face_size
         
+        self._model_changed()
+        
         print(f"Updated thresholds: confidence={self.confidence_threshold}, max_distance={self.max_distance_threshold}, min_face={self.min_face_size}")
 
@@ -0,0 +1,52 @@
+import os
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+def _lock(f):
+    if fcntl is not None:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        return
+    f.seek(0)
+    while True:
+        try:
+            # LK_LOCK gives up after about 10 seconds; keep waiting
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            return
+        except OSError:
+            continue
+
+
+def _unlock(f):
+    if fcntl is not None:
+        fcntl.flock(f, fcntl.LOCK_UN)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+@contextmanager
+def exclusive_lock(path):
+    """Hold an exclusive lock on `path` across processes for the block (waits for it)
+
+    The file is created if needed and only serves as the lock. Yields whether
+    the lock is held: a directory the file cannot be created in is treated as
+    having no other writers, so the block runs unlocked.
+    """
+    try:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        f = open(path, "a+b")
+    except OSError:
+        yield False
+        return
+    with f:
+        _lock(f)
+        try:
+            yield True
+        finally:
+            _unlock(f)
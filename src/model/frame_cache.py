@@ -0,0 +1,149 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+# Side of the grayscale thumbnail compared to confirm a hash match, and of the
+# blocks it is compared in
+THUMBNAIL_SIZE = 64
+BLOCK_SIZE = 4
+
+
+def frame_signature(image):
+    """(64-bit difference hash, 64x64 thumbnail) of a BGR or gray frame
+
+    Both come from a strided sample of the frame (green channel for colour
+    frames), so computing them does not depend on the frame's resolution.
+    """
+    step = max(1, max(image.shape[:2]) // (THUMBNAIL_SIZE * 4))
+    sample = np.ascontiguousarray(image[::step, ::step, 1] if image.ndim == 3 else image[::step, ::step])
+    thumbnail = cv2.resize(sample, (THUMBNAIL_SIZE, THUMBNAIL_SIZE), interpolation=cv2.INTER_AREA)
+    small = cv2.resize(thumbnail, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big"), thumbnail
+
+
+class _Entry:
+    __slots__ = ("key", "hash", "thumbnail", "result", "cost", "expires", "ready")
+
+    def __init__(self, key, frame_hash, thumbnail):
+        self.key = key
+        self.hash = frame_hash
+        self.thumbnail = thumbnail
+        self.result = None
+        self.cost = 0.0
+        self.expires = 0.0
+        self.ready = threading.Event()
+
+
+class FrameResultCache:
+    """Bounded LRU/TTL cache of recognition results for near-identical frames
+
+    A frame matches a cached one when their difference hashes are at most
+    `max_distance` bits apart and no 4x4 block of their thumbnails differs by
+    more than `max_difference` grey levels on average. Comparing blocks rather
+    than whole frames matters: another person in front of the same kiosk
+    background changes the frame's mean less than sensor noise does, but
+    changes the blocks covering the face by 25+ grey levels.
+    Results are only reused under the same `key` (request options, model
+    generation and thresholds). Concurrent requests for a frame that is
+    being recognized wait for that result instead of recomputing it.
+    """
+
+    def __init__(self, max_entries=256, ttl=30.0, max_distance=4, max_difference=6.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_distance = max_distance
+        self.max_difference = max_difference
+        self._entries = OrderedDict()
+        self._pending = []
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.saved_seconds = 0.0
+
+    def _similar(self, entry, key, frame_hash, thumbnail):
+        if entry.key != key or (entry.hash ^ frame_hash).bit_count() > self.max_distance:
+            return False
+        grid = THUMBNAIL_SIZE // BLOCK_SIZE
+        blocks = cv2.resize(cv2.absdiff(entry.thumbnail, thumbnail), (grid, grid), interpolation=cv2.INTER_AREA)
+        return blocks.max() <= self.max_difference
+
+    def get_or_compute(self, image, key, compute, store=None):
+        """Cached result for a frame like `image`, else `compute()`'s result
+
+        The computed result is cached unless `store(result)` says otherwise.
+        """
+        frame_hash, thumbnail = frame_signature(image)
+        now = time.monotonic()
+        with self._lock:
+            for entry_id, entry in list(self._entries.items()):
+                if entry.expires < now:
+                    del self._entries[entry_id]
+                elif self._similar(entry, key, frame_hash, thumbnail):
+                    self._entries.move_to_end(entry_id)
+                    self.hits += 1
+                    self.saved_seconds += entry.cost
+                    return copy.deepcopy(entry.result)
+            for entry in self._pending:
+                if self._similar(entry, key, frame_hash, thumbnail):
+                    break
+            else:
+                entry = None
+            if entry is None:
+                self.misses += 1
+                entry = _Entry(key, frame_hash, thumbnail)
+                self._pending.append(entry)
+                leader = True
+            else:
+                self.coalesced += 1
+                leader = False
+
+        if not leader:
+            entry.ready.wait()
+            if entry.result is not None:
+                with self._lock:
+                    self.saved_seconds += entry.cost
+                return copy.deepcopy(entry.result)
+            # The leader failed or its result was not cacheable
+            return compute()
+
+        start = time.perf_counter()
+        try:
+            result = compute()
+            if store is None or store(result):
+                entry.result = result
+                entry.cost = time.perf_counter() - start
+                entry.expires = time.monotonic() + self.ttl
+                with self._lock:
+                    self._entries[id(entry)] = entry
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+            return copy.deepcopy(result)
+        finally:
+            with self._lock:
+                self._pending.remove(entry)
+            entry.ready.set()
+
+    def clear(self):
+        """Drop every cached result (in-flight computations still finish)"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "hit_rate": round((self.hits + self.coalesced) / lookups, 3) if lookups else 0.0,
+                "saved_cpu_seconds": round(self.saved_seconds, 3),
+            }
@@ -0,0 +1,58 @@
+"""
+Gunicorn settings for the FaceTrust AI API (picked up automatically when
+gunicorn is started from this directory, see the Procfile)
+
+The app is preloaded: the model is trained, or loaded from a snapshot, once in
+the master and inherited by every worker instead of being rebuilt per worker.
+Set FACETRUST_PRELOAD=0 to go back to one model build per worker.
+
+Workers default to one per CPU of the effective budget (affinity capped by the
+cgroup quota, e.g. systemd CPUQuota) and each worker sizes OpenCV's threads to
+its share of it. FACETRUST_PIN_WORKERS=1 also pins each worker to one CPU.
+
+Each worker starts its own log writer thread (log_config) and serves
+FACETRUST_THREADS (4) requests or recognition streams at a time.
+"""
+import gc
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import log_config
+import runtime_config
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+workers = int(os.environ.get("WEB_CONCURRENCY", runtime_config.default_workers()))
+# The preloaded app sizes its thread pools from this
+os.environ["WEB_CONCURRENCY"] = str(workers)
+preload_app = os.environ.get("FACETRUST_PRELOAD", "1") != "0"
+# Threaded (gthread) workers: an open /recognize/stream WebSocket holds one
+# thread for its whole session, not the worker (a sync worker would also be
+# killed by the worker timeout)
+threads = int(os.environ.get("FACETRUST_THREADS", 4))
+
+
+def _face_model():
+    # Already imported by the preload; never imported from here otherwise
+    import web_interface
+    return web_interface.face_model
+
+
+def when_ready(server):
+    """Runs in the master after the preload, right before workers are forked"""
+    if not preload_app:
+        return
+    _face_model().prepare_for_fork()
+    # Move every object created so far out of the collector's reach: a GC pass
+    # in a worker would otherwise write to their headers and un-share the pages
+    gc.collect()
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    """Rebuild the per-process parts of the inherited model in each worker"""
+    log_config.after_fork()
+    runtime_config.configure(workers=server.cfg.workers, worker_index=worker.age)
+    if preload_app:
+        _face_model().after_fork()
@@ -0,0 +1,221 @@
+import base64
+import io
+import struct
+import threading
+
+import cv2
+import numpy as np
+
+# Largest encoded image accepted in one upload; the receive buffer is
+# allocated up front from Content-Length, so it must be bounded
+MAX_IMAGE_BYTES = 16 * 1024 * 1024
+
+
+# Grayscale decode flags per reduction factor; JPEG decoders scale in the DCT
+# domain, so a reduced decode also does a fraction of the work
+REDUCED_GRAYSCALE = {
+    1: cv2.IMREAD_GRAYSCALE,
+    2: cv2.IMREAD_REDUCED_GRAYSCALE_2,
+    4: cv2.IMREAD_REDUCED_GRAYSCALE_4,
+    8: cv2.IMREAD_REDUCED_GRAYSCALE_8,
+}
+
+# Receive buffers, one per request thread, reused across requests
+_buffers = threading.local()
+
+
+class ImagePayloadError(ValueError):
+    """The request's image is missing, unreadable or too large (`status` is the HTTP code)"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def decode_image_buffer(buffer, flags=cv2.IMREAD_COLOR):
+    """Decode encoded image bytes (any buffer: bytes, bytearray, memoryview), None if invalid"""
+    if len(buffer) == 0:
+        return None
+    return cv2.imdecode(np.frombuffer(buffer, np.uint8), flags)
+
+
+def image_size(buffer):
+    """(width, height) from a JPEG or PNG header without decoding, None for other formats"""
+    data = memoryview(buffer)
+    if bytes(data[:8]) == b"\x89PNG\r\n\x1a\n" and len(data) >= 24:
+        return struct.unpack(">II", data[16:24])
+    if bytes(data[:2]) != b"\xff\xd8":
+        return None
+    offset = 2
+    while offset + 4 <= len(data):
+        if data[offset] != 0xFF:
+            return None
+        marker = data[offset + 1]
+        if marker == 0xFF:  # Fill byte
+            offset += 1
+            continue
+        if marker == 0x01 or 0xD0 <= marker <= 0xD8:  # Markers without a length
+            offset += 2
+            continue
+        length = struct.unpack(">H", data[offset + 2:offset + 4])[0]
+        # Start-of-frame markers (not DHT/JPG/DAC) carry the dimensions
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            if offset + 9 > len(data):
+                return None
+            height, width = struct.unpack(">HH", data[offset + 5:offset + 9])
+            return width, height
+        offset += 2 + length
+    return None
+
+
+def reduction_factor(size, max_side):
+    """Largest JPEG reduction (1, 2, 4 or 8) that keeps the longer side at `max_side` or more"""
+    if not size or not max_side:
+        return 1
+    for factor in (8, 4, 2):
+        if max(size) / factor >= max_side:
+            return factor
+    return 1
+
+
+def decode_for_recognition(buffer, max_side=None):
+    """(grayscale frame, scale back to the original's coordinates), None if invalid
+
+    Frames whose header says they are much larger than `max_side` are decoded
+    reduced by 2, 4 or 8, never below `max_side` on the longer side.
+    """
+    factor = reduction_factor(image_size(buffer), max_side)
+    image = decode_image_buffer(buffer, REDUCED_GRAYSCALE[factor])
+    if image is None:
+        return None
+    return image, float(factor)
+
+
+def read_for_recognition(path, max_side=None):
+    """decode_for_recognition of an image file, None if it cannot be read or decoded"""
+    try:
+        with open(path, "rb") as f:
+            return decode_for_recognition(f.read(), max_side)
+    except OSError:
+        return None
+
+
+def decode_image_bytes(image_bytes):
+    """Decode encoded image bytes (JPEG, PNG, ...) to a BGR image, None if invalid"""
+    return decode_image_buffer(image_bytes)
+
+
+def base64_payload_bytes(image_data):
+    """Bytes of a base64 (optionally data-URL) encoded image"""
+    if image_data.startswith('data:image'):
+        image_data = image_data.partition(',')[2]
+    return base64.b64decode(image_data)
+
+
+def decode_base64_image(image_data):
+    """Decode a base64 (optionally data-URL) encoded image"""
+    return decode_image_bytes(base64_payload_bytes(image_data))
+
+
+def receive_buffer(length):
+    """This thread's reusable receive buffer, grown to at least `length` bytes"""
+    buffer = getattr(_buffers, "buffer", None)
+    if buffer is None or len(buffer) < length:
+        buffer = _buffers.buffer = bytearray(length)
+    return buffer
+
+
+def read_into_buffer(stream, length):
+    """Read up to `length` bytes from `stream` into this thread's receive buffer, as a memoryview
+
+    The view is only valid until the thread's next read.
+    """
+    if not hasattr(stream, 'readinto'):
+        # e.g. SpooledTemporaryFile before Python 3.11
+        return memoryview(stream.read(length))
+    buffer = memoryview(receive_buffer(length))[:length]
+    filled = 0
+    while filled < length:
+        count = stream.readinto(buffer[filled:])
+        if not count:
+            break
+        filled += count
+    return buffer[:filled]
+
+
+def _decode_upload(storage, decode):
+    """Decode a multipart file part without copying it when it is held in memory"""
+    stream = storage.stream
+    stream.seek(0, io.SEEK_END)
+    size = stream.tell()
+    stream.seek(0)
+    if size > MAX_IMAGE_BYTES:
+        raise ImagePayloadError(f"Image larger than {MAX_IMAGE_BYTES} bytes", 413)
+    if isinstance(stream, io.BytesIO):
+        # The view must be released before the request closes the stream
+        with stream.getbuffer() as view:
+            return decode(view)
+    return decode(read_into_buffer(stream, size))
+
+
+def decode_request_image(request, field='image', decode=decode_image_buffer):
+    """The image of a Flask request, BGR unless another `decode(buffer)` is given
+
+    Accepted bodies, checked in this order:
+      - a raw `image/*` body (e.g. `Content-Type: image/jpeg`), streamed into
+        a buffer sized from Content-Length and decoded in place
+      - `multipart/form-data` with the image in the `field` part (or the only part)
+      - JSON with a base64 (optionally data-URL) string in `field`
+
+    Raises ImagePayloadError when no image was sent or it cannot be decoded.
+    """
+    if request.mimetype.startswith('image/'):
+        length = request.content_length
+        if length is not None and length > MAX_IMAGE_BYTES:
+            raise ImagePayloadError(f"Image larger than {MAX_IMAGE_BYTES} bytes", 413)
+        if length is None:
+            # Chunked upload: the size is not known up front
+            body = request.stream.read(MAX_IMAGE_BYTES + 1)
+            if len(body) > MAX_IMAGE_BYTES:
+                raise ImagePayloadError(f"Image larger than {MAX_IMAGE_BYTES} bytes", 413)
+            image = decode(body)
+        else:
+            image = decode(read_into_buffer(request.stream, length))
+    elif request.mimetype == 'multipart/form-data':
+        files = request.files
+        storage = files.get(field) or (next(iter(files.values())) if len(files) == 1 else None)
+        if storage is None:
+            raise ImagePayloadError(f"No '{field}' file part provided")
+        image = _decode_upload(storage, decode)
+    else:
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict) or not data.get(field):
+            raise ImagePayloadError("No image data provided")
+        try:
+            payload = base64_payload_bytes(data[field])
+        except (ValueError, TypeError, AttributeError):
+            # Malformed base64 (binascii.Error) or not a string
+            raise ImagePayloadError("Could not decode image")
+        image = decode(payload)
+
+    if image is None:
+        raise ImagePayloadError("Could not decode image")
+    return image
+
+
+def decode_request_frame(request, max_side=None, field='image'):
+    """(grayscale frame, scale to original coordinates) of a Flask request, see decode_for_recognition"""
+    return decode_request_image(request, field, lambda buffer: decode_for_recognition(buffer, max_side))
+
+
+def scale_boxes(result, scale):
+    """Map a recognition/verification result's bounding boxes back to the uploaded image's coordinates"""
+    if scale == 1.0:
+        return result
+    boxes = [face["bounding_box"] for face in result.get("results", []) if "bounding_box" in face]
+    if "bounding_box" in result:
+        boxes.append(result["bounding_box"])
+    for box in boxes:
+        for key in box:
+            box[key] = int(round(box[key] * scale))
+    return result
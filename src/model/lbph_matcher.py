@@ -0,0 +1,272 @@
+import os
+
+import cv2
+import numpy as np
+
+METRICS = ("chi_square_alt", "euclidean")
+
+# On-disk layout of a saved matcher, one .npy file per array
+GALLERY_FILE = "gallery_t.npy"
+LABELS_FILE = "labels.npy"
+ROW_STATS_FILE = "row_stats_{metric}.npy"
+
+
+def compute_histograms(faces, radius=1, neighbors=8, grid_x=8, grid_y=8, recognizer=None):
+    """LBPH spatial histograms of normalized face crops, one float32 row per face
+
+    OpenCV does not expose the histogram of a probe image, so the faces are fed
+    to a throwaway recognizer whose `train()` computes exactly the histograms
+    `predict()` would compare against. A caller-owned `recognizer` with the same
+    parameters can be passed to reuse it; `train()` discards its previous state.
+    """
+    if len(faces) == 0:
+        return np.zeros((0, 0), dtype=np.float32)
+    if recognizer is None:
+        recognizer = cv2.face.LBPHFaceRecognizer_create(
+            radius=radius, neighbors=neighbors, grid_x=grid_x, grid_y=grid_y
+        )
+    recognizer.train(np.asarray(faces), np.zeros(len(faces), dtype=np.int32))
+    return np.vstack(recognizer.getHistograms()).astype(np.float32, copy=False)
+
+
+def top_identities(distances, labels, k):
+    """Sorted (label, distance) of the `k` best identities in a distance row"""
+    if k == 1:
+        best = int(distances.argmin())
+        return [(int(labels[best]), float(distances[best]))]
+
+    count = len(distances)
+    # Over-fetch samples so identities with several photos still yield k names
+    fetch = min(count, 4 * k)
+    while True:
+        if fetch < count:
+            nearest = np.argpartition(distances, fetch - 1)[:fetch]
+        else:
+            nearest = np.arange(count)
+        nearest = nearest[np.argsort(distances[nearest], kind="stable")]
+
+        candidates = []
+        seen = set()
+        for index in nearest:
+            label = int(labels[index])
+            if label not in seen:
+                seen.add(label)
+                candidates.append((label, float(distances[index])))
+                if len(candidates) == k:
+                    return candidates
+        if fetch >= count:
+            return candidates
+        fetch = min(count, fetch * 2)
+
+
+class LBPHMatcher:
+    """Gallery of LBPH histograms packed into one float32 matrix
+
+    The matrix is stored transposed (bins x samples) so the bins that are
+    non-zero in a probe can be gathered as contiguous rows. With
+    `chi_square_alt` (the metric used by `LBPHFaceRecognizer.predict`),
+
+        2 * sum((a - b)^2 / (a + b)) = 2 * (sum(a) + sum(b)) - 8 * sum(a*b / (a + b))
+
+    and a*b / (a + b) vanishes wherever either histogram is empty, so roughly
+    half of the bins never have to be touched.
+
+    Samples can be appended without disturbing concurrent readers: the arrays
+    are over-allocated and readers only look at the first `size` columns of
+    the view they picked up.
+
+    A matcher opened with `load(..., mmap_mode="r")` reads its arrays straight
+    from the page cache, so every process that opens the same files shares one
+    copy of the gallery. The first `add()` moves the arrays into private memory.
+    """
+
+    def __init__(self, histograms, labels, metric="chi_square_alt", block_bins=512, capacity=None):
+        if metric not in METRICS:
+            raise ValueError(f"Unknown metric '{metric}', expected one of {METRICS}")
+
+        histograms = np.asarray(histograms, dtype=np.float32)
+        labels = np.asarray(labels, dtype=np.int32).ravel()
+        count, bins = histograms.shape
+
+        self.metric = metric
+        self.block_bins = block_bins
+        self.bins = bins
+
+        capacity = max(capacity or 0, count, 16)
+        gallery_t = np.zeros((bins, capacity), dtype=np.float32)
+        gallery_t[:, :count] = histograms.T
+        all_labels = np.full(capacity, -1, dtype=np.int32)
+        all_labels[:count] = labels
+        row_stats = np.zeros(capacity, dtype=np.float64)
+        row_stats[:count] = self._row_stats(histograms)
+
+        # (gallery_t, labels, row_stats, size) is swapped as a single reference
+        self._view = (gallery_t, all_labels, row_stats, count)
+        self._index_columns()
+
+    @classmethod
+    def from_recognizer(cls, recognizer, **kwargs):
+        """Pack the histograms of a trained `LBPHFaceRecognizer`"""
+        histograms = np.vstack(recognizer.getHistograms())
+        return cls(histograms, recognizer.getLabels(), **kwargs)
+
+    def save(self, directory):
+        """Write the gallery arrays as .npy files that `load` can memory-map"""
+        gallery_t, labels, row_stats, size = self._view
+        # np.save streams non-contiguous views, so no full copy is made here
+        np.save(os.path.join(directory, GALLERY_FILE), gallery_t[:, :size])
+        np.save(os.path.join(directory, LABELS_FILE), labels[:size])
+        np.save(os.path.join(directory, ROW_STATS_FILE.format(metric=self.metric)), row_stats[:size])
+
+    @classmethod
+    def load(cls, directory, metric="chi_square_alt", block_bins=512, mmap_mode="r"):
+        """Open a gallery written by `save`, memory-mapped unless `mmap_mode` is None"""
+        if metric not in METRICS:
+            raise ValueError(f"Unknown metric '{metric}', expected one of {METRICS}")
+        matcher = cls.__new__(cls)
+        matcher.metric = metric
+        matcher.block_bins = block_bins
+
+        gallery_t = np.load(os.path.join(directory, GALLERY_FILE), mmap_mode=mmap_mode)
+        labels = np.load(os.path.join(directory, LABELS_FILE))
+        matcher.bins = gallery_t.shape[0]
+        if gallery_t.ndim != 2 or gallery_t.shape[1] != len(labels):
+            raise ValueError(f"Inconsistent gallery files in {directory}")
+
+        row_stats_path = os.path.join(directory, ROW_STATS_FILE.format(metric=metric))
+        if os.path.exists(row_stats_path):
+            row_stats = np.load(row_stats_path)
+        else:
+            # Saved under another metric: recompute in chunks of samples
+            row_stats = np.concatenate([matcher._row_stats(np.asarray(gallery_t[:, start:start + 4096].T))
+                                        for start in range(0, len(labels), 4096)] or [np.zeros(0)])
+        # No spare capacity: the first add() copies into private, growable arrays
+        matcher._view = (gallery_t, labels, row_stats, len(labels))
+        matcher._index_columns()
+        return matcher
+
+    def _index_columns(self):
+        labels = self.labels
+        order = np.argsort(labels, kind="stable")
+        unique, starts = np.unique(labels[order], return_index=True)
+        self._columns = {int(label): columns for label, columns in zip(unique, np.split(order, starts[1:]))}
+
+    def columns_of(self, label):
+        """Gallery columns holding samples of `label` (empty if there are none)"""
+        return self._columns.get(int(label), np.zeros(0, dtype=np.int64))
+
+    @property
+    def size(self):
+        return self._view[3]
+
+    @property
+    def histograms(self):
+        """Gallery histograms as a (samples x bins) view"""
+        gallery_t, _, _, size = self._view
+        return gallery_t[:, :size].T
+
+    @property
+    def labels(self):
+        labels, size = self._view[1], self._view[3]
+        return labels[:size]
+
+    def _row_stats(self, histograms):
+        if self.metric == "euclidean":
+            return np.einsum("ij,ij->i", histograms, histograms, dtype=np.float64)
+        return histograms.sum(axis=1, dtype=np.float64)
+
+    def add(self, histograms, labels):
+        """Append samples; callers must serialize writers"""
+        histograms = np.asarray(histograms, dtype=np.float32).reshape(-1, self.bins)
+        labels = np.asarray(labels, dtype=np.int32).ravel()
+        gallery_t, all_labels, row_stats, size = self._view
+        new_size = size + len(histograms)
+
+        if new_size > gallery_t.shape[1]:
+            # Grow geometrically so appends stay amortized O(bins)
+            capacity = max(new_size, gallery_t.shape[1] * 2)
+            grown_t = np.zeros((self.bins, capacity), dtype=np.float32)
+            grown_t[:, :size] = gallery_t[:, :size]
+            grown_labels = np.full(capacity, -1, dtype=np.int32)
+            grown_labels[:size] = all_labels[:size]
+            grown_stats = np.zeros(capacity, dtype=np.float64)
+            grown_stats[:size] = row_stats[:size]
+            gallery_t, all_labels, row_stats = grown_t, grown_labels, grown_stats
+
+        # Columns past `size` are invisible to readers until the view is swapped
+        gallery_t[:, size:new_size] = histograms.T
+        all_labels[size:new_size] = labels
+        row_stats[size:new_size] = self._row_stats(histograms)
+        self._view = (gallery_t, all_labels, row_stats, new_size)
+
+        # Published after the view, so readers never see columns it lacks
+        for label in np.unique(labels):
+            added = size + np.flatnonzero(labels == label)
+            self._columns[int(label)] = np.concatenate((self.columns_of(label), added))
+
+    def subset(self, keep, labels=None):
+        """New matcher holding only the samples at indices `keep`"""
+        keep = np.asarray(keep, dtype=np.int64)
+        return LBPHMatcher(
+            self.histograms[keep], self.labels[keep] if labels is None else labels,
+            metric=self.metric, block_bins=self.block_bins
+        )
+
+    def distances(self, probe_histograms, columns=None):
+        """Distance of every probe (rows) to every gallery sample (columns)
+
+        `columns` restricts the comparison to a subset of gallery samples.
+        """
+        probes = np.asarray(probe_histograms, dtype=np.float32).reshape(-1, self.bins)
+        gallery_t, _, row_stats, size = self._view
+        gallery_t = gallery_t[:, :size]
+        row_stats = row_stats[:size]
+        if columns is not None:
+            # Gathered block by block below, never as a full (bins x columns) copy
+            columns = np.asarray(columns, dtype=np.int64)
+            row_stats = row_stats[columns]
+
+        result = np.empty((len(probes), len(row_stats)), dtype=np.float64)
+        for i, probe in enumerate(probes):
+            if self.metric == "euclidean":
+                selected = gallery_t if columns is None else gallery_t[:, columns]
+                squared = row_stats + float(np.dot(probe, probe)) - 2.0 * (probe @ selected)
+                result[i] = np.sqrt(np.maximum(squared, 0.0))
+            else:
+                result[i] = self._chi_square_alt(gallery_t, row_stats, probe, columns)
+        return result
+
+    def _chi_square_alt(self, gallery_t, row_sums, probe, columns=None):
+        nonzero = np.flatnonzero(probe)
+        harmonic = np.zeros(len(row_sums), dtype=np.float32)
+
+        for start in range(0, len(nonzero), self.block_bins):
+            bins = nonzero[start:start + self.block_bins]
+            block = gallery_t[bins] if columns is None else gallery_t[np.ix_(bins, columns)]
+            probe_block = probe[bins, None]
+            product = block * probe_block
+            block += probe_block
+            product /= block
+            harmonic += product.sum(axis=0)
+
+        distances = 2.0 * (row_sums + float(probe.sum(dtype=np.float64))) - 8.0 * harmonic
+        # Cancellation can leave tiny negative values for identical histograms
+        return np.maximum(distances, 0.0)
+
+    def predict(self, probe_histograms):
+        """Nearest gallery sample per probe, as (label, distance) like `predict()`"""
+        return [candidates[0] if candidates else (-1, float("inf"))
+                for candidates in self.search(probe_histograms, k=1)]
+
+    def search(self, probe_histograms, k=5):
+        """The `k` nearest identities per probe as sorted (label, distance) lists
+
+        An identity's distance is that of its closest sample. Candidates are
+        picked with `argpartition`, so the cost stays close to the single scan
+        that computes the distances.
+        """
+        if self.size == 0:
+            return [[] for _ in range(len(probe_histograms))]
+        distances = self.distances(probe_histograms)
+        labels = self.labels
+        return [top_identities(row, labels, k) for row in distances]
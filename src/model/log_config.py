@@ -0,0 +1,192 @@
+"""
+Logging shared by every FaceTrust backend
+
+Request threads only put records on a bounded queue; a background thread
+formats them and writes them to stdout and, optionally, a size-rotated file.
+When the writer falls behind, records are dropped (and counted) rather than
+blocking a request. Per-level sampling keeps the per-face DEBUG records to a
+fraction of the volume.
+
+Configured from the environment:
+  FACETRUST_LOG_LEVEL      minimum level (INFO)
+  FACETRUST_LOG_FORMAT     json (one JSON object per line) or text (json)
+  FACETRUST_LOG_FILE       also write to this file (the backend's own default)
+  FACETRUST_LOG_MAX_BYTES  rotate the file at this size (10 MB)
+  FACETRUST_LOG_BACKUPS    rotated files kept (5)
+  FACETRUST_LOG_SAMPLING   kept fraction per level, e.g. "DEBUG=0.05,INFO=1" (DEBUG=0.1)
+  FACETRUST_LOG_ASYNC      0 writes from the calling thread, for debugging (1)
+"""
+import atexit
+import copy
+import datetime
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+
+# Records waiting for the writer thread before new ones are dropped
+QUEUE_SIZE = 10000
+
+# LogRecord attributes that are not user fields passed with extra=
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+_listener = None
+_queue_handler = None
+_traceback_formatter = logging.Formatter()
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record; fields passed with `extra=` are included as they are"""
+
+    def format(self, record):
+        entry = {
+            "time": datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "pid": record.process,
+            "thread": record.threadName,
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps each record with the probability configured for its level (1.0 when not configured)"""
+
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record):
+        rate = self.rates.get(record.levelno, 1.0)
+        return rate >= 1.0 or random.random() < rate
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops records instead of failing when the queue is full"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Like QueueHandler.prepare, but the traceback stays out of the message
+        record = copy.copy(record)
+        record.message = record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = _traceback_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def parse_sampling(spec):
+    """{level number: kept fraction} from "DEBUG=0.05,INFO=1" """
+    rates = {}
+    for item in spec.split(","):
+        if "=" not in item:
+            continue
+        level, rate = item.split("=", 1)
+        level = logging.getLevelName(level.strip().upper())
+        if isinstance(level, int):
+            rates[level] = max(0.0, min(1.0, float(rate)))
+    return rates
+
+
+def _writers(log_file, formatter):
+    handlers = [logging.StreamHandler(sys.stdout)]
+    if log_file:
+        handlers.append(logging.handlers.RotatingFileHandler(
+            log_file,
+            maxBytes=int(os.environ.get("FACETRUST_LOG_MAX_BYTES", 10 * 1024 * 1024)),
+            backupCount=int(os.environ.get("FACETRUST_LOG_BACKUPS", 5)),
+            encoding="utf-8"))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    return handlers
+
+
+def configure(log_file=None):
+    """Route the root logger through the queue and background writer (safe to call again)
+
+    `log_file` is the backend's default file, FACETRUST_LOG_FILE overrides it.
+    """
+    global _listener, _queue_handler
+    shutdown()
+    _queue_handler = None
+
+    level = logging.getLevelName(os.environ.get("FACETRUST_LOG_LEVEL", "INFO").upper())
+    if not isinstance(level, int):
+        level = logging.INFO
+    if os.environ.get("FACETRUST_LOG_FORMAT", "json") == "text":
+        formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    else:
+        formatter = JsonFormatter()
+    writers = _writers(os.environ.get("FACETRUST_LOG_FILE", log_file), formatter)
+    sampling = SamplingFilter(parse_sampling(os.environ.get("FACETRUST_LOG_SAMPLING", "DEBUG=0.1")))
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+        handler.close()
+    root.setLevel(level)
+
+    if os.environ.get("FACETRUST_LOG_ASYNC", "1") == "0":
+        for handler in writers:
+            handler.addFilter(sampling)
+            root.addHandler(handler)
+        return
+
+    # Sampling runs on the calling thread, before a record is queued
+    _queue_handler = DroppingQueueHandler(queue.Queue(QUEUE_SIZE))
+    _queue_handler.addFilter(sampling)
+    root.addHandler(_queue_handler)
+    _listener = logging.handlers.QueueListener(_queue_handler.queue, *writers, respect_handler_level=True)
+    _listener.start()
+
+
+def after_fork():
+    """Start a writer thread in a forked worker (threads do not survive fork())"""
+    global _listener
+    if _listener is None:
+        return
+    # The inherited queue's locks may have been held by the parent's writer
+    _queue_handler.queue = queue.Queue(QUEUE_SIZE)
+    _listener = logging.handlers.QueueListener(_queue_handler.queue, *_listener.handlers, respect_handler_level=True)
+    _listener.start()
+
+
+def shutdown():
+    """Write out the queued records and stop the writer thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+def stats():
+    """Queue depth and records dropped because the writer fell behind"""
+    if _queue_handler is None:
+        return {"async": False}
+    return {"async": _listener is not None, "queued": _queue_handler.queue.qsize(), "dropped": _queue_handler.dropped}
+
+
+atexit.register(shutdown)
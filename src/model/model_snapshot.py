@@ -0,0 +1,119 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from lbph_matcher import LBPHMatcher
+
+# Bump whenever the on-disk layout or the training pipeline changes in a way
+# that makes older snapshots unsafe to reuse.
+SNAPSHOT_VERSION = 6
+
+FACES_FILE = "faces.npy"
+META_FILE = "meta.json"
+
+
+def compute_gallery_fingerprint(entries, params):
+    """Hash the gallery contents (name, size, mtime) and training parameters
+
+    `entries` are the `GalleryImage` records returned by `scan_gallery`, so the
+    fingerprint costs no extra filesystem calls.
+    """
+    digest = hashlib.sha256()
+    digest.update(f"snapshot-v{SNAPSHOT_VERSION}\n".encode("utf-8"))
+    digest.update(json.dumps(params, sort_keys=True).encode("utf-8"))
+
+    for entry in sorted(entries, key=lambda e: e.file_name):
+        digest.update(f"\n{entry.file_name}|{entry.size}|{entry.mtime_ns}".encode("utf-8"))
+
+    return digest.hexdigest()
+
+
+def snapshot_path(snapshot_dir, fingerprint):
+    """Directory holding the snapshot for a given fingerprint"""
+    return Path(snapshot_dir) / f"v{SNAPSHOT_VERSION}-{fingerprint[:16]}"
+
+
+def save_snapshot(snapshot_dir, fingerprint, matcher, class_names, faces, image_metadata, params):
+    """Write a snapshot atomically; returns the snapshot directory or None
+
+    The gallery is stored as plain .npy arrays rather than the recognizer's
+    YAML so that `load_snapshot` can memory-map it instead of parsing it.
+    """
+    snapshot_dir = Path(snapshot_dir)
+    target = snapshot_path(snapshot_dir, fingerprint)
+
+    try:
+        snapshot_dir.mkdir(parents=True, exist_ok=True)
+        staging = Path(tempfile.mkdtemp(prefix=".staging-", dir=snapshot_dir))
+
+        matcher.save(staging)
+        np.save(staging / FACES_FILE, np.asarray(faces, dtype=np.uint8))
+
+        meta = {
+            "version": SNAPSHOT_VERSION,
+            "fingerprint": fingerprint,
+            "created_at": time.time(),
+            "params": params,
+            "class_names": list(class_names),
+            "images": image_metadata,
+        }
+        with open(staging / META_FILE, "w") as f:
+            json.dump(meta, f, indent=2)
+
+        if target.exists():
+            # Another worker got there first with identical content
+            shutil.rmtree(staging, ignore_errors=True)
+        else:
+            os.replace(staging, target)
+
+        prune_snapshots(snapshot_dir, keep=target.name)
+        return target
+
+    except Exception as e:
+        print(f"⚠ Could not save model snapshot: {str(e)}")
+        return None
+
+
+def load_snapshot(snapshot_dir, fingerprint, metric="chi_square_alt"):
+    """Open a matching snapshot; returns its metadata or None
+
+    The gallery matcher ("matcher") and face crops ("faces") are memory-mapped
+    read-only, so processes serving the same snapshot share their pages.
+    """
+    target = snapshot_path(snapshot_dir, fingerprint)
+    meta_path = target / META_FILE
+
+    if not meta_path.exists():
+        return None
+
+    try:
+        with open(meta_path, "r") as f:
+            meta = json.load(f)
+
+        if meta.get("version") != SNAPSHOT_VERSION or meta.get("fingerprint") != fingerprint:
+            return None
+
+        meta["matcher"] = LBPHMatcher.load(target, metric=metric, mmap_mode="r")
+        meta["faces"] = np.load(target / FACES_FILE, mmap_mode="r")
+        return meta
+
+    except Exception as e:
+        print(f"⚠ Ignoring unreadable model snapshot {target.name}: {str(e)}")
+        return None
+
+
+def prune_snapshots(snapshot_dir, keep):
+    """Remove snapshots other than `keep`, plus stale staging directories"""
+    for entry in Path(snapshot_dir).iterdir():
+        if entry.name == keep or not entry.is_dir():
+            continue
+        if entry.name.startswith(".staging-") and time.time() - entry.stat().st_mtime < 3600:
+            # Possibly still being written by a concurrent worker
+            continue
+        shutil.rmtree(entry, ignore_errors=True)
@@ -0,0 +1,132 @@
+import math
+import os
+
+import cv2
+
+# Settings chosen by `configure`, reported by /status
+current = {}
+
+
+CGROUP_ROOT = "/sys/fs/cgroup"
+
+
+def _cgroup_dirs(controller):
+    """Cgroup directories of this process from its own up to the root, tightest limit first
+
+    Under systemd without a cgroup namespace /sys/fs/cgroup is the host root and
+    the service's limits live in its own sub-directory (/proc/self/cgroup).
+    """
+    path = "/"
+    try:
+        with open("/proc/self/cgroup") as f:
+            for line in f:
+                _, controllers, cgroup_path = line.rstrip("\n").split(":", 2)
+                if controllers == controller or controller in controllers.split(","):
+                    path = cgroup_path
+                    break
+    except OSError:
+        pass
+    base = CGROUP_ROOT if controller == "" else os.path.join(CGROUP_ROOT, "cpu")
+    dirs = []
+    while True:
+        dirs.append(os.path.join(base, path.lstrip("/")))
+        if path in ("/", ""):
+            return dirs
+        path = os.path.dirname(path)
+
+
+def _read_quota_v2(directory):
+    # "<quota> <period>" or "max <period>"
+    with open(os.path.join(directory, "cpu.max")) as f:
+        quota, period = f.read().split()
+    return None if quota == "max" else int(quota) / int(period)
+
+
+def _read_quota_v1(directory):
+    with open(os.path.join(directory, "cpu.cfs_quota_us")) as f:
+        quota = int(f.read())
+    with open(os.path.join(directory, "cpu.cfs_period_us")) as f:
+        period = int(f.read())
+    return None if quota <= 0 else quota / period
+
+
+def cgroup_cpu_quota():
+    """CPU limit imposed by the cgroups (e.g. systemd CPUQuota=50% -> 0.5), or None
+
+    The smallest quota on the way from this process's cgroup to the root wins.
+    """
+    quotas = []
+    for controller, read in (("", _read_quota_v2), ("cpu", _read_quota_v1)):
+        for directory in _cgroup_dirs(controller):
+            try:
+                quota = read(directory)
+            except (OSError, ValueError):
+                continue
+            if quota is not None:
+                quotas.append(quota)
+        if quotas:
+            break
+    return min(quotas) if quotas else None
+
+
+def affinity_cpus():
+    """CPUs this process may run on"""
+    try:
+        return sorted(os.sched_getaffinity(0))
+    except AttributeError:
+        return list(range(os.cpu_count() or 1))
+
+
+def cpu_budget():
+    """Whole CPUs the service can actually use: the affinity set capped by the cgroup quota"""
+    budget = len(affinity_cpus())
+    quota = cgroup_cpu_quota()
+    if quota is not None:
+        budget = min(budget, max(1, math.ceil(quota)))
+    return budget
+
+
+def default_workers():
+    """Worker processes for a CPU-bound server: one per CPU of the budget"""
+    return cpu_budget()
+
+
+def server_workers():
+    """Server processes sharing the CPU budget (WEB_CONCURRENCY, 1 without gunicorn)"""
+    return max(1, int(os.environ.get("WEB_CONCURRENCY", 1)))
+
+
+def cpu_share(workers=None):
+    """This process's share of the CPU budget, at least one CPU"""
+    return max(1, cpu_budget() // (workers or server_workers()))
+
+
+def configure(workers=None, worker_index=None, pin=None):
+    """Size OpenCV's thread pool to this process's share of the CPU budget
+
+    `workers` is the number of server processes sharing the budget
+    (default `server_workers()`). With `pin` (FACETRUST_PIN_WORKERS=1) and a
+    `worker_index`, the process is also pinned to one CPU of the affinity set.
+    """
+    workers = workers or server_workers()
+    if pin is None:
+        pin = os.environ.get("FACETRUST_PIN_WORKERS") == "1"
+
+    cv2.setNumThreads(cpu_share(workers))
+
+    pinned = None
+    if pin and worker_index is not None and hasattr(os, "sched_setaffinity"):
+        cpus = affinity_cpus()
+        pinned = cpus[worker_index % len(cpus)]
+        os.sched_setaffinity(0, {pinned})
+
+    current.clear()
+    current.update({
+        "cgroup_cpu_quota": cgroup_cpu_quota(),
+        "affinity_cpus": len(affinity_cpus()),
+        "cpu_budget": cpu_budget(),
+        "workers": workers,
+        "opencv_threads": cv2.getNumThreads(),
+        "pinned_cpu": pinned,
+    })
+    return dict(current)
@@ -0,0 +1,89 @@
+import threading
+import time
+
+
+class LatestFrame:
+    """One-frame mailbox: a frame arriving while another is still waiting replaces it"""
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._item = None
+        self._closed = False
+        self.received = 0
+        self.dropped = 0
+
+    def put(self, frame):
+        with self._condition:
+            self.received += 1
+            if self._item is not None:
+                self.dropped += 1
+            self._item = (self.received, time.perf_counter(), frame)
+            self._condition.notify()
+
+    def take(self):
+        """(sequence number, arrival time, frame) of the newest frame, waiting for one; None once closed"""
+        with self._condition:
+            while self._item is None and not self._closed:
+                self._condition.wait()
+            if self._closed:
+                return None
+            item, self._item = self._item, None
+            return item
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+
+class StreamSession:
+    """Recognition of one client's stream of frames, newest frame first
+
+    `run(receive)` reads frames with `receive()` (None when the client is
+    gone) while a worker thread recognizes them: `process(frame, stats)`
+    returns the text sent back with `send(text)`. Frames that arrive while
+    one is being processed replace each other, so a client sending faster
+    than the server can recognize gets results for its latest frame instead
+    of a growing backlog; stale frames are never even decoded.
+    """
+
+    def __init__(self, process, send):
+        self.process = process
+        self.send = send
+        self.frames = LatestFrame()
+        self.processed = 0
+        self.closed = False
+
+    def run(self, receive):
+        worker = threading.Thread(target=self._work, name="stream-session", daemon=True)
+        worker.start()
+        try:
+            while not self.closed:
+                frame = receive()
+                if frame is None:
+                    break
+                self.frames.put(frame)
+        finally:
+            self.frames.close()
+            worker.join()
+
+    def _work(self):
+        while True:
+            item = self.frames.take()
+            if item is None:
+                return
+            sequence, arrived, frame = item
+            stats = {
+                "frame": sequence,
+                "frames_received": self.frames.received,
+                "frames_dropped": self.frames.dropped,
+                "waited_ms": round((time.perf_counter() - arrived) * 1000, 1),
+            }
+            try:
+                self.send(self.process(frame, stats))
+            except Exception:
+                # The client is gone; the receive loop will notice as well
+                self.closed = True
+                self.frames.close()
+                return
+            self.processed += 1
@@ -2,21 +2,71 @@ from flask import Flask, request, jsonify, render_template_string
 from flask_cors import CORS
 import sys
 import os
-import base64
-import numpy as np
-import cv2
 import json
+import logging
+import datetime
+import hmac
+import time
 
 # Add the current directory to Python path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from face_model import FaceRecognitionModel
+from face_detectors import DEFAULT_DETECTOR, DETECTORS
+from face_model import AmbiguousClaimError, FaceRecognitionModel
+from identity_templates import COMPACT_IDENTITY_FIELDS, IdentityTemplates
+from image_io import (MAX_IMAGE_BYTES, ImagePayloadError, base64_payload_bytes, decode_for_recognition,
+                      decode_request_frame, scale_boxes)
+from stream_session import StreamSession
+import log_config
+import runtime_config
+
+try:
+    # Optional: WebSocket support for /recognize/stream (pip install flask-sock)
+    from flask_sock import Sock
+    from simple_websocket import ConnectionClosed
+except ImportError:
+    Sock = None
+
+# Queued, sampled JSON logging (FACETRUST_LOG_* settings, see log_config)
+log_config.configure()
+logger = logging.getLogger(__name__)
+
+# Size OpenCV's thread pool to the CPU budget (gunicorn re-applies this per worker)
+runtime_config.configure()
 
 app = Flask(__name__)
 CORS(app, origins=["*"])  # Allow all origins for testing
 
-# Initialize face recognition model
-face_model = FaceRecognitionModel()
+# Initialize face recognition model; it reloads itself when Models/ changes
+# (FACETRUST_WATCH_INTERVAL seconds between checks, 0 disables)
+# FACETRUST_DETECTOR picks the deployment's face detector backend
+face_model = FaceRecognitionModel(watch_interval=float(os.environ.get("FACETRUST_WATCH_INTERVAL", 5)),
+                                  detector=os.environ.get("FACETRUST_DETECTOR", DEFAULT_DETECTOR))
+
+# Pre-built /recognize identity payloads, rebuilt when the gallery or team data changes
+identity_templates = IdentityTemplates(face_model)
+
+# Extra /status sections, name -> function returning them (e.g. asgi_app's executor)
+status_sources = {}
+
+# Upper bound for the ?top_k= candidate list on /recognize
+MAX_TOP_K = 50
+
+# Upper bound for the number of images in one /recognize/batch request
+MAX_BATCH_IMAGES = 64
+
+# Bearer token for the gallery writes (POST /enroll, DELETE /enroll/<name>);
+# while it is unset those routes are refused
+ADMIN_TOKEN = os.environ.get("FACETRUST_ADMIN_TOKEN") or None
+
+def admin_refusal():
+    """(response, status) refusing a gallery write without the admin token, None when it is present"""
+    if ADMIN_TOKEN is None:
+        return jsonify({"success": False, "error": "Enrollment is disabled (FACETRUST_ADMIN_TOKEN is not set)"}), 403
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    if scheme.lower() != 'bearer' or not hmac.compare_digest(token.strip().encode(), ADMIN_TOKEN.encode()):
+        return jsonify({"success": False, "error": "Admin token required"}), 401
+    return None
 
 @app.route('/')
 def home():
@@ -24,9 +74,15 @@ def home():
         "message": "FaceTrust AI Face Recognition API",
         "version": "1.0.0",
         "endpoints": {
-            "/recognize": "POST - Recognize face from base64 image",
+            "/recognize": "POST - Recognize face from a raw image/jpeg|png body, multipart `image` part or base64 JSON (?top_k=N for nearest candidates, ?detector=NAME, ?faces=all, ?fields=a,b or ?compact=1 to trim the identity)",
+            "/recognize/batch": "POST - Recognize many images (JSON `images` array or multipart parts)",
+            "/recognize/stream": "WebSocket - Continuous recognition of binary or base64 frames, newest frame first (needs flask-sock)",
+            "/verify": "POST - Verify a face against a claimed employee_id, unique_id_number or name",
+            "/enroll": "POST - Enroll a team member from base64 image (admin token; add_sample=true for another photo of an existing member)",
+            "/enroll/<name>": "DELETE - Remove an enrolled team member (admin token)",
             "/team": "GET - Get team member data",
-            "/health": "GET - Health check"
+            "/health": "GET - Health check",
+            "/status": "GET - CPU budget, thread/worker settings, result cache and log queue metrics"
         }
     })
 
@@ -51,6 +107,18 @@ def health():
             "model_loaded": False
         }), 500
 
+@app.route('/status')
+def status():
+    return jsonify({
+        "pid": os.getpid(),
+        "runtime": runtime_config.current,
+        "recognition_threads": runtime_config.cpu_share(),
+        "result_cache": face_model.result_cache.stats() if face_model.result_cache is not None else None,
+        "model_generation": face_model.generation,
+        "logging": log_config.stats(),
+        **{name: stats() for name, stats in status_sources.items()}
+    })
+
 @app.route('/team')
 def get_team():
     try:
@@ -67,14 +135,134 @@ def get_team():
             "status": "error"
         }), 500
 
+def recognition_options(args):
+    """Options of a /recognize request from its query string (ValueError for an unknown detector)"""
+    # Optional ?top_k=N: also return the N nearest identities
+    top_k = args.get('top_k', type=int)
+    if top_k is not None:
+        top_k = max(1, min(top_k, MAX_TOP_K))
+    
+    # Optional ?detector=NAME: use another detector backend for this image
+    detector = args.get('detector')
+    if detector is not None and detector not in DETECTORS:
+        raise ValueError(f"Unknown detector '{detector}', expected one of {sorted(DETECTORS)}")
+    
+    # Optional ?fields=a,b: only these identity fields; ?compact=1: the
+    # essential identity fields and no technical_details
+    compact = args.get('compact', '0').lower() in ('1', 'true', 'yes')
+    identity_fields = args.get('fields')
+    if identity_fields is not None:
+        identity_fields = [field.strip() for field in identity_fields.split(',') if field.strip()]
+    elif compact:
+        identity_fields = COMPACT_IDENTITY_FIELDS
+    
+    return {
+        "top_k": top_k,
+        "detector": detector,
+        # Only the first face is reported, so by default only the largest one is
+        # detected and recognized; ?faces=all searches for every face
+        "primary_only": args.get('faces', 'primary') != 'all',
+        "identity_fields": identity_fields,
+        "compact": compact,
+    }
+
+def recognition_payload(result, options, extra=None):
+    """The /recognize response for a recognition result, as JSON text (`extra` fields are added)"""
+    identity_json = None
+    if result.get("success") and result.get("faces_found", 0) > 0:
+        face_result = result["results"][0]  # Take first face
+        
+        if face_result["matched"]:
+            # The member's identity fields are built and serialized once per
+            # model generation (identity_templates); only the per-request
+            # fields are filled in here
+            template = identity_templates.get(face_result["name"])
+            confidence_percentage = round(face_result["confidence"] * 100, 1)
+            timestamp = f"{datetime.datetime.utcnow().isoformat()}Z"
+            session_id = f"SESSION-{hash(str(time.time())) % 100000:05d}"
+            
+            response = {
+                "matched": True,
+                "confidence": face_result["confidence"],
+                "confidence_percentage": confidence_percentage,
+                "liveness": 0.95,  # High liveness for team members
+                "reason": template.reason(confidence_percentage),
+                "processing_time": 850,
+                "image_quality": face_result.get("image_quality"),
+                "technical_details": {
+                    "distance": face_result.get("distance", 0),
+                    "raw_confidence": face_result["confidence"],
+                    "face_coordinates": face_result.get("bounding_box", {}),
+                    "algorithm": "LBPH",
+                    "model_version": "1.0",
+                    "detection_time": timestamp
+                }
+            }
+            if options["identity_fields"] is not None:
+                response["identity"] = template.render(options["identity_fields"], face_result["confidence"],
+                                                       timestamp, session_id)
+            else:
+                identity_json = template.render_json(face_result["confidence"], timestamp, session_id)
+        else:
+            # NOT VERIFIED
+            response = {
+                "matched": False,
+                "confidence": face_result["confidence"],
+                "liveness": 0.75,
+                "identity": None,
+                "reason": face_result.get("reason", "Individual not found in authorized database"),
+                "processing_time": 650,
+                "image_quality": face_result.get("image_quality"),
+                "security_alert": "UNAUTHORIZED ACCESS ATTEMPT",
+                "technical_details": {
+                    "distance": face_result.get("distance", 999),
+                    "faces_detected": result.get("faces_found", 0),
+                    "algorithm": "LBPH",
+                    "detection_time": f"{datetime.datetime.utcnow().isoformat()}Z"
+                }
+            }
+        
+        if options["top_k"]:
+            response["candidates"] = face_result.get("candidates", [])
+            response["margin"] = face_result.get("margin")
+    else:
+        response = {
+            "matched": False,
+            "confidence": 0.0,
+            "liveness": 0.60,
+            "identity": None,
+            "reason": result.get("rejected") or result.get("error", "No face detected in image"),
+            "processing_time": 500
+        }
+        if "image_quality" in result:
+            response["image_quality"] = result["image_quality"]
+    
+    if options["compact"]:
+        response.pop("technical_details", None)
+    if extra:
+        response.update(extra)
+    body = app.json.dumps(response, separators=(",", ":"))
+    if identity_json is not None:
+        # Splice in the already serialized identity object
+        body = f'{body[:-1]},"identity":{identity_json}}}'
+    return body
+
+def log_recognition(result):
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Recognition result", extra={
+            "faces_found": result.get("faces_found", 0),
+            "matches": [face["name"] for face in result.get("results", []) if face.get("matched")],
+            "confidence": [round(face["confidence"], 3) for face in result.get("results", [])],
+            "rejected": result.get("rejected"),
+        })
+
 @app.route('/recognize', methods=['POST', 'OPTIONS'])
 def recognize_face():
     if request.method == 'OPTIONS':
         return '', 200
     
-    print("=== RECOGNIZE ENDPOINT CALLED ===")
-    print(f"Request method: {request.method}")
-    print(f"Content-Type: {request.headers.get('Content-Type')}")
+    logger.debug("Recognize request", extra={"content_type": request.headers.get('Content-Type'),
+                                              "content_length": request.content_length})
     
     try:
         # Check if model is trained
@@ -88,172 +276,41 @@ def recognize_face():
                 "known_faces": len(face_model.class_names)
             })
         
-        data = request.get_json()
-        
-        if 'image' not in data:
+        # Raw image/* body, multipart upload or base64 JSON (see image_io),
+        # decoded straight to grayscale and reduced when far above the
+        # detection resolution
+        try:
+            img, scale = decode_request_frame(request, face_model.detection_max_side)
+        except ImagePayloadError as e:
             return jsonify({
                 "matched": False,
                 "confidence": 0.0,
-                "reason": "No image data provided",
+                "reason": str(e),
                 "identity": None
-            }), 400
-        
-        # Decode base64 image
-        image_data = data['image']
-        if image_data.startswith('data:image'):
-            image_data = image_data.split(',')[1]
-        
-        image_bytes = base64.b64decode(image_data)
-        nparr = np.frombuffer(image_bytes, np.uint8)
-        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+            }), e.status
         
-        if img is None:
+        try:
+            options = recognition_options(request.args)
+        except ValueError as e:
             return jsonify({
                 "matched": False,
                 "confidence": 0.0,
-                "reason": "Could not decode image",
+                "reason": str(e),
                 "identity": None
             }), 400
         
         # Recognize face
-        result = face_model.recognize_face_from_image(img)
-        
-        print(f"Recognition result: {result}")
+        result = scale_boxes(face_model.recognize_face_from_image(img, top_k=options["top_k"],
+                                                                  detector=options["detector"],
+                                                                  primary_only=options["primary_only"],
+                                                                  scale=scale), scale)
+        log_recognition(result)
         
         # Format response for frontend
-        if result.get("success") and result.get("faces_found", 0) > 0:
-            face_result = result["results"][0]  # Take first face
-            
-            if face_result["matched"]:
-                team_data = face_result.get("team_data", {})
-                confidence_percentage = round(face_result["confidence"] * 100, 1)
-                
-                # COMPREHENSIVE IDENTITY DATA
-                response = {
-                    "matched": True,
-                    "confidence": face_result["confidence"],
-                    "confidence_percentage": confidence_percentage,
-                    "liveness": 0.95,  # High liveness for team members
-                    "identity": {
-                        # BASIC INFORMATION
-                        "full_name": team_data.get("full_name", face_result["name"]),
-                        "first_name": team_data.get("first_name", ""),
-                        "last_name": team_data.get("last_name", ""),
-                        "display_name": team_data.get("full_name", face_result["name"]),
-                        
-                        # PROFESSIONAL INFORMATION
-                        "position": team_data.get("position", "Team Member"),
-                        "department": team_data.get("department", "General"),
-                        "employee_id": team_data.get("employee_id", f"EMP-{face_result['name'][:3].upper()}"),
-                        "access_level": team_data.get("access_level", "Standard"),
-                        "hire_date": team_data.get("hire_date", "2024-01-01"),
-                        
-                        # CONTACT INFORMATION
-                        "email": team_data.get("email", f"{face_result['name'].lower().replace('_', '.')}@facetrustafrica.com"),
-                        "phone": team_data.get("phone", "+234-XXX-XXX-XXXX"),
-                        "work_phone": team_data.get("work_phone", team_data.get("phone", "+234-XXX-XXX-XXXX")),
-                        
-                        # PERSONAL INFORMATION
-                        "gender": team_data.get("gender", "Not specified"),
-                        "date_of_birth": team_data.get("date_of_birth", "Not specified"),
-                        "nationality": team_data.get("nationality", "Nigerian"),
-                        "marital_status": team_data.get("marital_status", "Not specified"),
-                        
-                        # IDENTIFICATION DOCUMENTS
-                        "nin": team_data.get("nin", "Not provided"),
-                        "unique_id_number": team_data.get("unique_id_number", f"FT-{face_result['name'].upper()}"),
-                        "passport_number": team_data.get("passport_number", "Not provided"),
-                        "drivers_license": team_data.get("drivers_license", "Not provided"),
-                        
-                        # ADDRESS INFORMATION
-                        "address_city": team_data.get("address_city", "Lagos"),
-                        "address_state": team_data.get("address_state", "Lagos State"),
-                        "address_country": team_data.get("address_country", "Nigeria"),
-                        "address_full": team_data.get("address_full", f"{team_data.get('address_city', 'Lagos')}, {team_data.get('address_state', 'Lagos State')}, {team_data.get('address_country', 'Nigeria')}"),
-                        "postal_code": team_data.get("postal_code", "100001"),
-                        
-                        # BIOMETRIC & SECURITY
-                        "biometric_id": f"BIO-{face_result['name'].upper()}-{hash(face_result['name']) % 10000:04d}",
-                        "face_encoding_id": f"FACE-{hash(face_result['name']) % 100000:05d}",
-                        "security_clearance": team_data.get("security_clearance", "Level-2"),
-                        "two_factor_enabled": team_data.get("two_factor_enabled", True),
-                        
-                        # SOCIAL & PROFESSIONAL
-                        "social_media": team_data.get("social_media", {
-                            "linkedin": f"linkedin.com/in/{face_result['name'].lower().replace('_', '-')}",
-                            "twitter": f"@{face_result['name'].lower()}",
-                            "github": f"github.com/{face_result['name'].lower()}"
-                        }),
-                        "professional_summary": team_data.get("bio", f"Professional team member at FaceTrust Africa - {team_data.get('position', 'Team Member')}"),
-                        
-                        # VERIFICATION & AUDIT
-                        "verification_history": {
-                            "total_verifications": team_data.get("verification_history", {}).get("verification_count", 1) + 1,
-                            "last_verified": team_data.get("verification_history", {}).get("last_verified", "2024-01-01T00:00:00Z"),
-                            "current_verification": f"{__import__('datetime').datetime.utcnow().isoformat()}Z",
-                            "risk_score": team_data.get("verification_history", {}).get("risk_score", 0),
-                            "verification_method": "Facial Recognition - LBPH Algorithm"
-                        },
-                        
-                        # EMPLOYMENT DETAILS
-                        "employment_status": "Active",
-                        "employment_type": team_data.get("employment_type", "Full-time"),
-                        "salary_grade": team_data.get("salary_grade", "Senior"),
-                        "reporting_manager": team_data.get("reporting_manager", "CEO"),
-                        "team_size": team_data.get("team_size", "5-10"),
-                        
-                        # SYSTEM METADATA
-                        "verification_level": "VERIFIED",
-                        "match_quality": "HIGH" if face_result["confidence"] > 0.7 else "MEDIUM" if face_result["confidence"] > 0.5 else "LOW",
-                        "system_confidence": confidence_percentage,
-                        "algorithm_used": "LBPH Face Recognition",
-                        "verification_timestamp": f"{__import__('datetime').datetime.utcnow().isoformat()}Z",
-                        "session_id": f"SESSION-{hash(str(__import__('time').time())) % 100000:05d}"
-                    },
-                    "reason": f"✅ Identity Verified: {team_data.get('full_name', face_result['name'])} - {team_data.get('position', 'Team Member')} ({confidence_percentage}% match)",
-                    "processing_time": 850,
-                    "technical_details": {
-                        "distance": face_result.get("distance", 0),
-                        "raw_confidence": face_result["confidence"],
-                        "face_coordinates": face_result.get("bounding_box", {}),
-                        "algorithm": "LBPH",
-                        "model_version": "1.0",
-                        "detection_time": f"{__import__('datetime').datetime.utcnow().isoformat()}Z"
-                    }
-                }
-            else:
-                # NOT VERIFIED
-                response = {
-                    "matched": False,
-                    "confidence": face_result["confidence"],
-                    "liveness": 0.75,
-                    "identity": None,
-                    "reason": face_result.get("reason", "Individual not found in authorized database"),
-                    "processing_time": 650,
-                    "security_alert": "UNAUTHORIZED ACCESS ATTEMPT",
-                    "technical_details": {
-                        "distance": face_result.get("distance", 999),
-                        "faces_detected": result.get("faces_found", 0),
-                        "algorithm": "LBPH",
-                        "detection_time": f"{__import__('datetime').datetime.utcnow().isoformat()}Z"
-                    }
-                }
-        else:
-            response = {
-                "matched": False,
-                "confidence": 0.0,
-                "liveness": 0.60,
-                "identity": None,
-                "reason": result.get("error", "No face detected in image"),
-                "processing_time": 500
-            }
-        
-        return jsonify(response)
+        return app.response_class(recognition_payload(result, options) + "\n", mimetype=app.json.mimetype)
         
     except Exception as e:
-        print(f"Recognition error: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Recognition error: %s", e)
         return jsonify({
             "matched": False,
             "confidence": 0.0,
@@ -261,6 +318,220 @@ def recognize_face():
             "identity": None
         }), 500
 
+if Sock is not None:
+    app.config['SOCK_SERVER_OPTIONS'] = {'max_message_size': MAX_IMAGE_BYTES, 'ping_interval': 25}
+    sock = Sock(app)
+    
+    @sock.route('/recognize/stream')
+    def recognize_stream(ws):
+        """Continuous recognition over one WebSocket
+        
+        The client sends frames as binary messages (JPEG/PNG bytes) or text
+        messages (base64, optionally data-URL); each result is pushed back as
+        the /recognize JSON response plus the frame's sequence number and
+        stream counters. Frames arriving while the server is busy are dropped
+        in favour of the newest one. Query parameters are those of /recognize.
+        """
+        try:
+            options = recognition_options(request.args)
+        except ValueError as e:
+            ws.send(json.dumps({"matched": False, "confidence": 0.0, "reason": str(e), "identity": None}))
+            return
+        
+        def process(frame, stats):
+            start = time.perf_counter()
+            try:
+                decoded = None
+                if not isinstance(frame, str):
+                    decoded = decode_for_recognition(frame, face_model.detection_max_side)
+                elif frame:
+                    decoded = decode_for_recognition(base64_payload_bytes(frame), face_model.detection_max_side)
+                if decoded is None:
+                    result = {"success": False, "error": "Could not decode image"}
+                else:
+                    img, scale = decoded
+                    result = scale_boxes(face_model.recognize_face_from_image(
+                        img, top_k=options["top_k"], detector=options["detector"],
+                        primary_only=options["primary_only"], scale=scale), scale)
+            except ValueError:
+                result = {"success": False, "error": "Could not decode image"}
+            except Exception as e:
+                logger.exception("Stream recognition error: %s", e)
+                result = {"success": False, "error": f"System error during verification: {str(e)}"}
+            log_recognition(result)
+            stats["processing_ms"] = round((time.perf_counter() - start) * 1000, 1)
+            return recognition_payload(result, options, stats)
+        
+        def receive():
+            try:
+                return ws.receive()
+            except ConnectionClosed:
+                return None
+        
+        session = StreamSession(process, ws.send)
+        session.run(receive)
+        logger.info("Recognition stream closed", extra={"frames_received": session.frames.received,
+                                                        "frames_dropped": session.frames.dropped,
+                                                        "frames_processed": session.processed})
+
+@app.route('/recognize/batch', methods=['POST', 'OPTIONS'])
+def recognize_batch():
+    """Recognize many images in one request, returned per image in request order
+
+    Images come as a JSON `images` array (base64 strings or {"image": ...}
+    objects) or as multipart file parts, several of which may share a field
+    name. ?top_k=, ?detector= and ?faces= work as on /recognize; the results
+    are the model's raw recognition results, so ?fields= and ?compact= do not apply.
+    """
+    if request.method == 'OPTIONS':
+        return '', 200
+    
+    try:
+        start = time.perf_counter()
+        if request.files:
+            # Every part, also when several share a field name (-F images=@a.jpg -F images=@b.jpg)
+            payloads = [part.read() for parts in request.files.listvalues() for part in parts]
+            to_bytes = bytes
+        else:
+            data = request.get_json(silent=True)
+            images = data.get('images') if isinstance(data, dict) else None
+            payloads = [item.get('image', '') if isinstance(item, dict) else item
+                        for item in (images if isinstance(images, list) else [])]
+            to_bytes = base64_payload_bytes
+        
+        if not payloads:
+            return jsonify({"success": False, "error": "No images provided"}), 400
+        if len(payloads) > MAX_BATCH_IMAGES:
+            return jsonify({"success": False,
+                            "error": f"At most {MAX_BATCH_IMAGES} images per batch"}), 413
+        
+        try:
+            options = recognition_options(request.args)
+        except ValueError as e:
+            return jsonify({"success": False, "error": str(e)}), 400
+        
+        # Grayscale, possibly reduced frames with their scale; the model maps
+        # boxes back to the uploaded images
+        def safe_decode(payload):
+            try:
+                return decode_for_recognition(to_bytes(payload), face_model.detection_max_side)
+            except Exception:
+                return None
+        
+        # Decoding and detection run on the model's thread pool; matching is
+        # one vectorized pass over every face in the batch
+        results = face_model.recognize_batch(payloads, top_k=options["top_k"], detector=options["detector"],
+                                             primary_only=options["primary_only"], decode=safe_decode)
+        
+        return jsonify({
+            "success": True,
+            "count": len(results),
+            "results": [{"index": i, **result} for i, result in enumerate(results)],
+            "processing_time_ms": round((time.perf_counter() - start) * 1000, 2)
+        })
+        
+    except Exception as e:
+        logger.exception("Batch recognition error: %s", e)
+        return jsonify({"success": False, "error": f"Batch recognition failed: {str(e)}"}), 500
+
+@app.route('/verify', methods=['POST', 'OPTIONS'])
+def verify_face():
+    """1:1 check of a face against a claimed identity (employee_id, unique_id_number or name)"""
+    if request.method == 'OPTIONS':
+        return '', 200
+    
+    try:
+        # With a raw image or multipart body the claim comes from the query
+        # string or form fields instead of the JSON body
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            data = request.values
+        claim = {field: data.get(field) for field in ('employee_id', 'unique_id_number', 'name')}
+        if not any(claim.values()):
+            return jsonify({"verified": False,
+                            "reason": "A claimed employee_id, unique_id_number or name is required"}), 400
+        
+        try:
+            name = face_model.resolve_claim(**claim)
+        except AmbiguousClaimError as e:
+            return jsonify({"verified": False, "reason": str(e), "claim": claim}), 409
+        if name is None:
+            return jsonify({"verified": False, "reason": "Claimed identity is not enrolled", "claim": claim}), 404
+        
+        try:
+            img, scale = decode_request_frame(request, face_model.detection_max_side)
+        except ImagePayloadError as e:
+            return jsonify({"verified": False, "reason": str(e)}), e.status
+        
+        result = scale_boxes(face_model.verify_face_from_image(img, name, scale), scale)
+        if not result.get("success"):
+            return jsonify({"verified": False, "reason": result.get("error", "Verification failed")}), 404
+        
+        response = {key: value for key, value in result.items() if key != "success"}
+        if result["verified"]:
+            response["team_data"] = face_model.team_data.get(name, {})
+        response["verification_timestamp"] = f"{datetime.datetime.utcnow().isoformat()}Z"
+        return jsonify(response)
+        
+    except Exception as e:
+        logger.exception("Verification error: %s", e)
+        return jsonify({"verified": False, "reason": f"System error during verification: {str(e)}"}), 500
+
+@app.route('/enroll', methods=['POST', 'OPTIONS'])
+def enroll_member():
+    if request.method == 'OPTIONS':
+        return '', 200
+    
+    refusal = admin_refusal()
+    if refusal is not None:
+        return refusal
+    
+    try:
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            data = {}
+        name = data.get('name')
+        
+        if not name or 'image' not in data:
+            return jsonify({"success": False, "error": "Name and image are required"}), 400
+        
+        # Decoded like recognition frames and saved as uploaded, see enroll_from_image
+        try:
+            image_bytes = base64_payload_bytes(data['image'])
+        except (ValueError, TypeError, AttributeError):
+            return jsonify({"success": False, "error": "Could not decode image"}), 400
+        
+        # An existing member only gets another photo when the request asks for it
+        result = face_model.enroll_from_image(name, image_bytes, data.get('team_data'),
+                                              add_sample=data.get('add_sample') is True)
+        if result.get("success"):
+            return jsonify(result), 200
+        return jsonify(result), (409 if result.get("conflict") else 400)
+        
+    except Exception as e:
+        logger.exception("Enrollment error: %s", e)
+        return jsonify({"success": False, "error": f"Enrollment failed: {str(e)}"}), 500
+
+@app.route('/enroll/<name>', methods=['DELETE'])
+def remove_member(name):
+    refusal = admin_refusal()
+    if refusal is not None:
+        return refusal
+    
+    try:
+        if not face_model.remove_member(name):
+            return jsonify({"success": False, "error": f"Unknown team member: {name}"}), 404
+        
+        return jsonify({
+            "success": True,
+            "name": name,
+            "known_faces": len(face_model.class_names)
+        })
+        
+    except Exception as e:
+        logger.exception("Removal error: %s", e)
+        return jsonify({"success": False, "error": f"Removal failed: {str(e)}"}), 500
+
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 5000))
     app.run(host="0.0.0.0", port=port, debug=False)
\ No newline at end of file